@@ -0,0 +1,144 @@
+"""
+Benchmark de regresión del listado de órdenes (GET /orders)
+
+Llena la colección orders de una base de datos desechable de 10k a 1M documentos
+y mide la latencia de las pipelines de listado en cada tamaño. Con el filtro,
+el orden y el límite resueltos sobre el índice antes del lookup a users, la
+latencia de la primera página y de las páginas por cursor debe mantenerse plana.
+
+Nunca usar contra la base de producción: requiere BENCH_MONGODB_URI explícito.
+
+    BENCH_MONGODB_URI=mongodb://localhost:27017 python -m benchmarks.bench_orders_listing
+    BENCH_MONGODB_URI=... python -m benchmarks.bench_orders_listing --sizes 10000,100000 --legacy
+"""
+import os
+import sys
+import time
+import random
+import statistics
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import MongoClient, IndexModel, ASCENDING, DESCENDING
+
+from pipelines.order_pipelines import (
+    get_all_orders_pipeline,
+    get_orders_by_user_pipeline,
+    get_orders_keyset_pipeline
+)
+
+BENCH_URI = os.getenv("BENCH_MONGODB_URI")
+BENCH_DB = os.getenv("BENCH_DATABASE_NAME", "dulceria_bench")
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+USERS = 1_000
+PAGE_SIZE = 50
+REPETITIONS = 20
+INSERT_BATCH = 10_000
+# La latencia en el tamaño mayor puede ser como máximo FLAT_RATIO veces la del menor (+ margen absoluto)
+FLAT_RATIO = 3.0
+FLAT_SLACK_MS = 5.0
+
+
+def legacy_all_orders_pipeline(skip: int = 0, limit: int = 50) -> list:
+    """Forma anterior del listado: lookup a users sobre toda la colección antes de ordenar y paginar"""
+    return [
+        {"$lookup": {"from": "users", "localField": "id_user", "foreignField": "_id", "as": "user_info"}},
+        {"$project": {
+            "id": {"$toString": "$_id"},
+            "id_user": {"$toString": "$id_user"},
+            "user_name": {"$arrayElemAt": ["$user_info.name", 0]},
+            "date": 1, "subtotal": 1, "taxes": 1, "discount": 1, "total": 1, "_id": 0
+        }},
+        {"$sort": {"date": -1}},
+        {"$skip": skip},
+        {"$limit": limit}
+    ]
+
+
+def seed_users(db) -> list:
+    db.users.drop()
+    users = [{"_id": ObjectId(), "name": f"User {i}", "lastname": "Bench", "email": f"user{i}@bench.local"} for i in range(USERS)]
+    db.users.insert_many(users)
+    return [u["_id"] for u in users]
+
+
+def grow_orders(db, user_ids: list, target: int):
+    current = db.orders.estimated_document_count()
+    start = datetime(2020, 1, 1)
+    while current < target:
+        batch = min(INSERT_BATCH, target - current)
+        db.orders.insert_many([
+            {
+                "id_user": random.choice(user_ids),
+                "date": start + timedelta(seconds=current + i),
+                "subtotal": 10.0, "taxes": 0.1, "discount": 0.0, "total": 10.1
+            }
+            for i in range(batch)
+        ], ordered=False)
+        current += batch
+
+
+def measure(db, pipeline: list, repetitions: int) -> float:
+    """Mediana en milisegundos de ejecutar la pipeline completa"""
+    timings = []
+    for _ in range(repetitions):
+        started = time.perf_counter()
+        list(db.orders.aggregate(pipeline))
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def run(sizes: list, include_legacy: bool) -> int:
+    client = MongoClient(BENCH_URI)
+    db = client[BENCH_DB]
+    db.orders.drop()
+    db.orders.create_indexes([
+        IndexModel([("id_user", ASCENDING), ("date", DESCENDING), ("_id", DESCENDING)], name="id_user_date_id"),
+        IndexModel([("date", DESCENDING), ("_id", DESCENDING)], name="date_id"),
+    ])
+    user_ids = seed_users(db)
+    user_id = str(user_ids[0])
+
+    results = {}
+    for size in sizes:
+        grow_orders(db, user_ids, size)
+
+        # Cursor a mitad de la colección para medir una página "profunda"
+        middle = db.orders.find({}, {"date": 1}).sort([("date", -1), ("_id", -1)]).skip(size // 2).limit(1).next()
+
+        scenarios = {
+            "all_first_page": get_all_orders_pipeline(0, PAGE_SIZE),
+            "user_first_page": get_orders_by_user_pipeline(user_id, 0, PAGE_SIZE),
+            "all_cursor_deep_page": get_orders_keyset_pipeline(None, middle["date"], middle["_id"], PAGE_SIZE),
+        }
+        results[size] = {name: measure(db, pipeline, REPETITIONS) for name, pipeline in scenarios.items()}
+
+        if include_legacy:
+            results[size]["legacy_all_first_page"] = measure(db, legacy_all_orders_pipeline(0, PAGE_SIZE), 3)
+
+        print(f"orders={size:>9,}  " + "  ".join(f"{name}={ms:8.2f}ms" for name, ms in results[size].items()))
+
+    db.orders.drop()
+    db.users.drop()
+    client.close()
+
+    # Regresión: las pipelines nuevas deben mantenerse planas entre el tamaño menor y el mayor
+    smallest, largest = results[sizes[0]], results[sizes[-1]]
+    regressions = [
+        name for name in ("all_first_page", "user_first_page", "all_cursor_deep_page")
+        if largest[name] > smallest[name] * FLAT_RATIO + FLAT_SLACK_MS
+    ]
+    for name in regressions:
+        print(f"REGRESSION {name}: {smallest[name]:.2f}ms -> {largest[name]:.2f}ms")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    if not BENCH_URI:
+        sys.exit("Set BENCH_MONGODB_URI to a disposable MongoDB server (never the production database)")
+
+    args = sys.argv[1:]
+    sizes = DEFAULT_SIZES
+    if "--sizes" in args:
+        sizes = [int(size) for size in args[args.index("--sizes") + 1].split(",")]
+
+    sys.exit(run(sorted(sizes), "--legacy" in args))
@@ -0,0 +1,113 @@
+"""
+Benchmark del costo de serialización por endpoint
+
+Compara, sobre payloads con la forma de cada endpoint, el camino anterior
+(re-validación con el response_model + jsonable_encoder + json.dumps) con el
+actual (filtrado sin validar + orjson con datetime/ObjectId nativos). No
+necesita MongoDB: los documentos se generan en memoria.
+
+    python -m benchmarks.bench_serialization
+    python -m benchmarks.bench_serialization --repetitions 200
+"""
+import sys
+import json
+import time
+import random
+import statistics
+from datetime import datetime, timedelta
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+
+from models.catalogs import Catalog
+from models.bundle_details import BundleWithProducts
+from utils.responses import dumps, shape
+
+DEFAULT_REPETITIONS = 50
+
+
+def catalog_row() -> dict:
+    # Forma de get_catalog_with_type_pipeline / get_all_catalogs_with_types_pipeline
+    return {
+        "id": str(ObjectId()),
+        "id_catalog_type": str(ObjectId()),
+        "name": f"Producto {random.randint(1, 10_000)}",
+        "description": "Chocolate artesanal relleno de caramelo",
+        "cost": round(random.uniform(5, 500), 2),
+        "discount": random.choice([0, 10, 25]),
+        "active": True,
+        "catalog_type_description": "products"
+    }
+
+
+def order_row(base: datetime) -> dict:
+    # Forma de las pipelines de listado de órdenes
+    return {
+        "id": str(ObjectId()),
+        "id_user": str(ObjectId()),
+        "user_name": "Cliente",
+        "date": base - timedelta(minutes=random.randint(0, 100_000)),
+        "subtotal": 120.5,
+        "taxes": 1.21,
+        "discount": 0.0,
+        "total": 121.71
+    }
+
+
+def payloads() -> dict:
+    now = datetime.utcnow()
+    bundle = {
+        "id": str(ObjectId()), "id_catalog_type": str(ObjectId()), "name": "Bundle", "description": "Caja surtida",
+        "cost": 250.0, "discount": 10, "active": True,
+        # Forma de get_bundle_products_pipeline
+        "products": [
+            {"bundle_detail_id": str(ObjectId()), "id_producto": str(ObjectId()), "quantity": 2,
+             "product_name": "Producto", "product_description": "Dulce", "product_cost": 12.5, "product_active": True}
+            for _ in range(20)
+        ]
+    }
+    return {
+        "GET /catalogs (1000)": ({"catalogs": [catalog_row() for _ in range(1000)], "total": 1000, "skip": 0, "limit": 1000}, None),
+        "GET /catalogs/{id}": (catalog_row(), Catalog),
+        "GET /bundle/{id} (20 productos)": (bundle, BundleWithProducts),
+        "GET /orders (50)": ({"success": True, "data": [order_row(now) for _ in range(50)], "next_cursor": "x"}, None),
+    }
+
+
+def legacy_path(content, model) -> bytes:
+    if model is not None:
+        content = model.model_validate(content).model_dump(mode="json")
+    return json.dumps(jsonable_encoder(content, custom_encoder={ObjectId: str})).encode("utf-8")
+
+
+def fast_path(content, model) -> bytes:
+    if model is not None:
+        content = shape(content, model)
+    return dumps(content)
+
+
+def measure(fn, content, model, repetitions: int) -> float:
+    samples = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        fn(content, model)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def run(repetitions: int) -> int:
+    for name, (content, model) in payloads().items():
+        # Los dos caminos deben producir el mismo JSON
+        if json.loads(legacy_path(content, model)) != json.loads(fast_path(content, model)):
+            print(f"MISMATCH {name}")
+            return 1
+
+        legacy = measure(legacy_path, content, model, repetitions)
+        fast = measure(fast_path, content, model, repetitions)
+        print(f"{name:<32} legacy={legacy:8.3f}ms  orjson={fast:8.3f}ms  speedup={legacy / fast:6.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    repetitions = int(args[args.index("--repetitions") + 1]) if "--repetitions" in args else DEFAULT_REPETITIONS
+    sys.exit(run(repetitions))
@@ -0,0 +1,74 @@
+"""
+Benchmark del arranque de la aplicación
+
+Cada medición corre en un proceso nuevo (como un cold start de Railway o el
+reinicio de un worker) y sin credenciales en el entorno: importar main y
+construir la app no debe abrir conexiones, leer secretos ni inicializar
+Firebase. Mide el tiempo de import, de create_app() y del primer request a
+/health (sin lifespan, es decir sin MongoDB).
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --runs 20
+"""
+import os
+import sys
+import json
+import statistics
+import subprocess
+
+DEFAULT_RUNS = 10
+# Variables que no deben ser necesarias para importar la aplicación
+CREDENTIAL_VARS = [
+    "MONGODB_URI", "URI", "DATABASE_NAME", "MONGO_DB_NAME",
+    "SECRET_KEY", "FIREBASE_CREDENTIALS_BASE64", "FIREBASE_API_KEY", "FIREBASE_PROJECT_ID"
+]
+
+PROBE = """
+import json, time
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+app = main.create_app()
+t2 = time.perf_counter()
+from fastapi.testclient import TestClient
+status = TestClient(app).get("/health").status_code
+t3 = time.perf_counter()
+print(json.dumps({"import": t1 - t0, "create_app": t2 - t1, "first_request": t3 - t2, "status": status}))
+"""
+
+
+def run_probe(root: str) -> dict:
+    env = {k: v for k, v in os.environ.items() if k not in CREDENTIAL_VARS}
+    # cwd sin .env para que load_dotenv no encuentre credenciales
+    result = subprocess.run(
+        [sys.executable, "-c", f"import sys; sys.path.insert(0, {root!r})\n{PROBE}"],
+        env=env, cwd=os.path.join(root, "benchmarks"), capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "probe failed")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run(runs: int) -> int:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        samples = [run_probe(root) for _ in range(runs)]
+    except RuntimeError as e:
+        print(f"FAILED importing the app without credentials: {e}")
+        return 1
+
+    for phase in ("import", "create_app", "first_request"):
+        values = [s[phase] * 1000 for s in samples]
+        print(f"{phase:<14} median={statistics.median(values):8.2f}ms  max={max(values):8.2f}ms")
+
+    bad_status = [s["status"] for s in samples if s["status"] != 200]
+    if bad_status:
+        print(f"FAILED /health returned {bad_status[0]}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    runs = int(args[args.index("--runs") + 1]) if "--runs" in args else DEFAULT_RUNS
+    sys.exit(run(runs))
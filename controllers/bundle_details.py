@@ -1,6 +1,9 @@
-from models.bundle_details import BundleDetail, BundleWithProducts, AddProductToBundle
+from models.bundle_details import BundleDetail, AddProductToBundle
 from models.catalogs import Catalog
-from utils.mongodb import get_collection
+from utils.mongodb import get_async_collection
+from utils.reference_cache import get_catalog_type_by_description
+from utils.cache import invalidate_cache
+from utils.concurrency import fan_out
 from fastapi import HTTPException
 from bson import ObjectId
 from pipelines import (
@@ -12,16 +15,19 @@ from pipelines import (
     check_existing_product_in_bundle_pipeline
 )
 
-bundle_details_coll = get_collection("bundle_details")
-catalogs_coll = get_collection("catalogs")
-catalog_types_coll = get_collection("catalogtypes")
 
-async def get_bundle_with_products(bundle_id: str) -> BundleWithProducts:
+async def get_bundle_with_products(bundle_id: str) -> dict:
     """Obtener información completa del bundle con todos sus productos"""
+    bundle_details_coll = get_async_collection("bundle_details")
+    catalogs_coll = get_async_collection("catalogs")
     try:
         # Verificar que el bundle existe y es de tipo "bundle" usando pipeline
-        pipeline = get_bundle_with_catalog_type_pipeline(bundle_id)
-        bundle_result = list(catalogs_coll.aggregate(pipeline))
+        bundle_type = await get_catalog_type_by_description("bundle")
+        if not bundle_type:
+            raise HTTPException(status_code=404, detail="Bundle no encontrado o no es de tipo bundle")
+
+        pipeline = get_bundle_with_catalog_type_pipeline(bundle_id, bundle_type["_id"])
+        bundle_result = await (await catalogs_coll.aggregate(pipeline)).to_list()
 
         if not bundle_result:
             raise HTTPException(status_code=404, detail="Bundle no encontrado o no es de tipo bundle")
@@ -30,19 +36,20 @@ async def get_bundle_with_products(bundle_id: str) -> BundleWithProducts:
 
         # Obtener los productos del bundle usando pipeline optimizada
         products_pipeline = get_bundle_products_pipeline(bundle_id)
-        products = list(bundle_details_coll.aggregate(products_pipeline))
-
-        # Crear respuesta completa
-        bundle_response = BundleWithProducts(
-            id=str(bundle["_id"]),
-            id_catalog_type=str(bundle["id_catalog_type"]),
-            name=bundle["name"],
-            description=bundle["description"],
-            cost=bundle["cost"],
-            discount=bundle.get("discount", 0),
-            active=bundle.get("active", True),
-            products=products
-        )
+        products = await (await bundle_details_coll.aggregate(products_pipeline)).to_list()
+
+        # Crear respuesta completa con la forma de BundleWithProducts; los datos ya vienen
+        # tipados de la base, así que no se re-validan con el modelo
+        bundle_response = {
+            "id": str(bundle["_id"]),
+            "id_catalog_type": str(bundle["id_catalog_type"]),
+            "name": bundle["name"],
+            "description": bundle["description"],
+            "cost": bundle["cost"],
+            "discount": bundle.get("discount", 0),
+            "active": bundle.get("active", True),
+            "products": products
+        }
 
         return bundle_response
     except HTTPException:
@@ -52,38 +59,49 @@ async def get_bundle_with_products(bundle_id: str) -> BundleWithProducts:
 
 async def add_product_to_bundle(bundle_id: str, product_data: AddProductToBundle) -> dict:
     """Agregar un producto al bundle"""
+    bundle_details_coll = get_async_collection("bundle_details")
+    catalogs_coll = get_async_collection("catalogs")
     try:
         # Verificar que no se esté agregando el mismo bundle como producto (evitar recursión)
         if product_data.id_producto == bundle_id:
             raise HTTPException(status_code=400, detail="Cannot add bundle to itself")
 
-        # Validar bundle (existe, activo y es de tipo bundle) en una sola pipeline
-        bundle_pipeline = get_bundle_validation_pipeline(bundle_id)
-        bundle_result = list(catalogs_coll.aggregate(bundle_pipeline))
+        # Tipos "bundle" y "products" desde la caché de referencia
+        bundle_type, product_type = await fan_out(
+            get_catalog_type_by_description("bundle"),
+            get_catalog_type_by_description("products")
+        )
+
+        if not bundle_type:
+            raise HTTPException(status_code=404, detail="Bundle no encontrado, inactivo o no es de tipo bundle")
+        if not product_type:
+            raise HTTPException(status_code=404, detail="Producto no encontrado, inactivo o no es de tipo producto")
+
+        async def run(coll, pipeline):
+            return await (await coll.aggregate(pipeline)).to_list()
+
+        # Validar bundle y producto (existen, activos y del tipo correcto) y buscar el producto en el bundle, en paralelo
+        bundle_result, product_result, existing_result = await fan_out(
+            run(catalogs_coll, get_bundle_validation_pipeline(bundle_id, bundle_type["_id"])),
+            run(catalogs_coll, get_product_validation_pipeline(product_data.id_producto, product_type["_id"])),
+            run(bundle_details_coll, check_existing_product_in_bundle_pipeline(bundle_id, product_data.id_producto))
+        )
 
         if not bundle_result:
             raise HTTPException(status_code=404, detail="Bundle no encontrado, inactivo o no es de tipo bundle")
 
         bundle = bundle_result[0]
 
-        # Validar producto (existe, activo y es de tipo producto) en una sola pipeline
-        product_pipeline = get_product_validation_pipeline(product_data.id_producto)
-        product_result = list(catalogs_coll.aggregate(product_pipeline))
-
         if not product_result:
             raise HTTPException(status_code=404, detail="Producto no encontrado, inactivo o no es de tipo producto")
 
         product = product_result[0]
 
-        # Verificar si el producto ya existe en el bundle usando pipeline
-        existing_pipeline = check_existing_product_in_bundle_pipeline(bundle_id, product_data.id_producto)
-        existing_result = list(bundle_details_coll.aggregate(existing_pipeline))
-
         if existing_result:
             # Actualizar cantidad si ya existe
             existing_detail = existing_result[0]
             new_quantity = existing_detail["quantity"] + product_data.quantity
-            bundle_details_coll.update_one(
+            await bundle_details_coll.update_one(
                 {"_id": ObjectId(existing_detail["bundle_detail_id"])},
                 {"$set": {"quantity": new_quantity}}
             )
@@ -98,10 +116,13 @@ async def add_product_to_bundle(bundle_id: str, product_data: AddProductToBundle
             )
             
             bundle_detail_dict = bundle_detail.model_dump(exclude={"id"})
-            inserted = bundle_details_coll.insert_one(bundle_detail_dict)
+            bundle_detail_dict["id_producto"] = ObjectId(product_data.id_producto)
+            inserted = await bundle_details_coll.insert_one(bundle_detail_dict)
             detail_id = str(inserted.inserted_id)
             final_quantity = product_data.quantity
 
+        await invalidate_cache("bundles")
+
         # Retornar información del producto agregado
         return {
             "message": "Product added to bundle successfully",
@@ -120,10 +141,11 @@ async def add_product_to_bundle(bundle_id: str, product_data: AddProductToBundle
 
 async def remove_product_from_bundle(bundle_id: str, bundle_detail_id: str) -> dict:
     """Remover un producto del bundle"""
+    bundle_details_coll = get_async_collection("bundle_details")
     try:
         # Validar bundle y obtener detalle del bundle con información del producto en una sola pipeline
         bundle_detail_pipeline = get_bundle_detail_with_product_pipeline(bundle_id, bundle_detail_id)
-        bundle_detail_result = list(bundle_details_coll.aggregate(bundle_detail_pipeline))
+        bundle_detail_result = await (await bundle_details_coll.aggregate(bundle_detail_pipeline)).to_list()
         
         if not bundle_detail_result:
             raise HTTPException(status_code=404, detail="Product not found in bundle")
@@ -131,7 +153,8 @@ async def remove_product_from_bundle(bundle_id: str, bundle_detail_id: str) -> d
         bundle_detail = bundle_detail_result[0]
 
         # Eliminar el detalle del bundle
-        result = bundle_details_coll.delete_one({"_id": ObjectId(bundle_detail_id)})
+        result = await bundle_details_coll.delete_one({"_id": ObjectId(bundle_detail_id)})
+        await invalidate_cache("bundles")
         
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Product not found in bundle")
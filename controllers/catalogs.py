@@ -1,6 +1,8 @@
 from models.catalogs import Catalog
 from models.catalogtypes import CatalogType
-from utils.mongodb import get_collection
+from utils.mongodb import get_async_collection
+from utils.cache import invalidate_cache
+from utils.streaming import STREAM_BATCH_SIZE
 from fastapi import HTTPException
 from bson import ObjectId
 from pipelines.catalog_pipelines import (
@@ -10,15 +12,15 @@ from pipelines.catalog_pipelines import (
     get_all_catalogs_with_types_pipeline
 )
 
-coll = get_collection("catalogs")
-catalog_types_coll = get_collection("catalogtypes")
 
 async def create_catalog(catalog: Catalog) -> Catalog:
+    coll = get_async_collection("catalogs")
+    catalog_types_coll = get_async_collection("catalogtypes")
     try:
 
         # Validar que el catalog_type existe y está activo usando pipeline
         catalog_type_pipeline = validate_catalog_type_pipeline(catalog.id_catalog_type)
-        catalog_type_result = list(catalog_types_coll.aggregate(catalog_type_pipeline))
+        catalog_type_result = await (await catalog_types_coll.aggregate(catalog_type_pipeline)).to_list()
 
         if not catalog_type_result:
             raise HTTPException(status_code=400, detail="Catalog type not found or inactive")
@@ -27,12 +29,14 @@ async def create_catalog(catalog: Catalog) -> Catalog:
         catalog.description = catalog.description.strip()
 
         # Verificar si ya existe un catálogo con el mismo nombre
-        existing_catalog = coll.find_one({"name": {"$regex": f"^{catalog.name}$", "$options": "i"}})
+        existing_catalog = await coll.find_one({"name": {"$regex": f"^{catalog.name}$", "$options": "i"}})
         if existing_catalog:
             raise HTTPException(status_code=400, detail="Catalog with this name already exists")
 
         catalog_dict = catalog.model_dump(exclude={"id"})
-        inserted = coll.insert_one(catalog_dict)
+        catalog_dict["id_catalog_type"] = ObjectId(catalog.id_catalog_type)
+        inserted = await coll.insert_one(catalog_dict)
+        await invalidate_cache("catalogs", "bundles")
         catalog.id = str(inserted.inserted_id)
         return catalog
     except HTTPException:
@@ -41,11 +45,13 @@ async def create_catalog(catalog: Catalog) -> Catalog:
         raise HTTPException(status_code=500, detail=f"Error creating catalog: {str(e)}")
 
 async def get_catalogs() -> list[Catalog]:
+    coll = get_async_collection("catalogs")
     try:
         catalogs = []
-        for doc in coll.find():
+        async for doc in coll.find():
             # Mapear _id a id para el modelo Pydantic
             doc['id'] = str(doc['_id'])
+            doc['id_catalog_type'] = str(doc['id_catalog_type'])
             del doc['_id']
             catalog = Catalog(**doc)
             catalogs.append(catalog)
@@ -54,13 +60,14 @@ async def get_catalogs() -> list[Catalog]:
         raise HTTPException(status_code=500, detail=f"Error fetching catalogs: {str(e)}")
 
 async def get_catalogs(skip: int = 0, limit: int = 1000) -> dict:
+    coll = get_async_collection("catalogs")
     try:
         # Usar pipeline optimizada para obtener catálogos con información del tipo
         pipeline = get_all_catalogs_with_types_pipeline(skip, limit)
-        catalogs = list(coll.aggregate(pipeline))
+        catalogs = await (await coll.aggregate(pipeline)).to_list()
 
         # Contar total de documentos para paginación
-        total_count = coll.count_documents({"active": True})
+        total_count = await coll.count_documents({"active": True})
 
         return {
             "catalogs": catalogs,
@@ -71,11 +78,21 @@ async def get_catalogs(skip: int = 0, limit: int = 1000) -> dict:
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching catalogs: {str(e)}")
 
+async def open_catalogs_cursor():
+    """Cursor sobre todos los catálogos para el modo streaming (lotes de STREAM_BATCH_SIZE)"""
+    coll = get_async_collection("catalogs")
+    try:
+        pipeline = get_all_catalogs_with_types_pipeline(0, None)
+        return await coll.aggregate(pipeline, batchSize=STREAM_BATCH_SIZE)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching catalogs: {str(e)}")
+
 async def get_catalog_by_id(catalog_id: str) -> dict:
+    coll = get_async_collection("catalogs")
     try:
         # Usar pipeline para obtener catálogo con información del tipo
         pipeline = get_catalog_with_type_pipeline(catalog_id)
-        catalog_result = list(coll.aggregate(pipeline))
+        catalog_result = await (await coll.aggregate(pipeline)).to_list()
         
         if not catalog_result:
             raise HTTPException(status_code=404, detail="Catalog not found")
@@ -87,17 +104,17 @@ async def get_catalog_by_id(catalog_id: str) -> dict:
         raise HTTPException(status_code=500, detail=f"Error fetching catalog: {str(e)}")
 
 async def get_catalogs_by_type(catalog_type_description: str, skip: int = 0, limit: int = 10) -> dict:
+    coll = get_async_collection("catalogs")
     try:
         # Usar pipeline optimizada para obtener catálogos por tipo
         pipeline = get_catalogs_by_type_pipeline(catalog_type_description, skip, limit)
-        catalogs = list(coll.aggregate(pipeline))
+        catalogs = await (await coll.aggregate(pipeline)).to_list()
         
         # Contar total para paginación
         count_pipeline = [
-            {"$addFields": {"id_catalog_type_obj": {"$toObjectId": "$id_catalog_type"}}},
             {"$lookup": {
                 "from": "catalogtypes",
-                "localField": "id_catalog_type_obj", 
+                "localField": "id_catalog_type",
                 "foreignField": "_id",
                 "as": "catalog_type"
             }},
@@ -109,7 +126,7 @@ async def get_catalogs_by_type(catalog_type_description: str, skip: int = 0, lim
             {"$count": "total"}
         ]
         
-        count_result = list(coll.aggregate(count_pipeline))
+        count_result = await (await coll.aggregate(count_pipeline)).to_list()
         total_count = count_result[0]["total"] if count_result else 0
         
         return {
@@ -123,16 +140,19 @@ async def get_catalogs_by_type(catalog_type_description: str, skip: int = 0, lim
         raise HTTPException(status_code=500, detail=f"Error fetching catalogs by type: {str(e)}")
 
 async def get_catalogs_by_type(catalog_type_id: str) -> list[Catalog]:
+    coll = get_async_collection("catalogs")
+    catalog_types_coll = get_async_collection("catalogtypes")
     try:
         # Validar que el catalog_type existe
-        catalog_type = catalog_types_coll.find_one({"_id": ObjectId(catalog_type_id)})
+        catalog_type = await catalog_types_coll.find_one({"_id": ObjectId(catalog_type_id)})
         if not catalog_type:
             raise HTTPException(status_code=404, detail="Catalog type not found")
 
         catalogs = []
-        for doc in coll.find({"id_catalog_type": catalog_type_id}):
+        async for doc in coll.find({"id_catalog_type": ObjectId(catalog_type_id)}):
             # Mapear _id a id para el modelo Pydantic
             doc['id'] = str(doc['_id'])
+            doc['id_catalog_type'] = str(doc['id_catalog_type'])
             del doc['_id']
             catalog = Catalog(**doc)
             catalogs.append(catalog)
@@ -143,9 +163,11 @@ async def get_catalogs_by_type(catalog_type_id: str) -> list[Catalog]:
         raise HTTPException(status_code=500, detail=f"Error fetching catalogs by type: {str(e)}")
 
 async def update_catalog(catalog_id: str, catalog: Catalog) -> Catalog:
+    coll = get_async_collection("catalogs")
+    catalog_types_coll = get_async_collection("catalogtypes")
     try:
         # Validar que el catalog_type existe
-        catalog_type = catalog_types_coll.find_one({"_id": ObjectId(catalog.id_catalog_type)})
+        catalog_type = await catalog_types_coll.find_one({"_id": ObjectId(catalog.id_catalog_type)})
         if not catalog_type:
             raise HTTPException(status_code=400, detail="Catalog type not found")
 
@@ -153,20 +175,26 @@ async def update_catalog(catalog_id: str, catalog: Catalog) -> Catalog:
         catalog.description = catalog.description.strip()
 
         # Verificar si ya existe otro catálogo con el mismo nombre
-        existing_catalog = coll.find_one({
+        existing_catalog = await coll.find_one({
             "name": {"$regex": f"^{catalog.name}$", "$options": "i"},
             "_id": {"$ne": ObjectId(catalog_id)}
         })
         if existing_catalog:
             raise HTTPException(status_code=400, detail="Catalog with this name already exists")
 
-        result = coll.update_one(
+        catalog_dict = catalog.model_dump(exclude={"id"})
+        catalog_dict["id_catalog_type"] = ObjectId(catalog.id_catalog_type)
+
+        result = await coll.update_one(
             {"_id": ObjectId(catalog_id)},
-            {"$set": catalog.model_dump(exclude={"id"})}
+            {"$set": catalog_dict}
         )
         if result.modified_count == 0:
             raise HTTPException(status_code=404, detail="Catalog not found")
 
+        # Los bundles incluyen datos de sus productos: también se invalidan
+        await invalidate_cache("catalogs", "bundles")
+
         return await get_catalog_by_id(catalog_id)
     except HTTPException:
         raise
@@ -174,14 +202,17 @@ async def update_catalog(catalog_id: str, catalog: Catalog) -> Catalog:
         raise HTTPException(status_code=500, detail=f"Error updating catalog: {str(e)}")
 
 async def deactivate_catalog(catalog_id: str) -> Catalog:
+    coll = get_async_collection("catalogs")
     try:
-        result = coll.update_one(
+        result = await coll.update_one(
             {"_id": ObjectId(catalog_id)},
             {"$set": {"active": False}}
         )
         if result.modified_count == 0:
             raise HTTPException(status_code=404, detail="Catalog not found")
 
+        await invalidate_cache("catalogs", "bundles")
+
         return await get_catalog_by_id(catalog_id)
     except HTTPException:
         raise
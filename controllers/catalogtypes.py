@@ -1,5 +1,6 @@
 from models.catalogtypes import CatalogType
-from utils.mongodb import get_collection
+from utils.mongodb import get_async_collection
+from utils.cache import invalidate_cache
 from fastapi import HTTPException
 from bson import ObjectId
 
@@ -8,34 +9,37 @@ from pipelines.catalog_type_pipelines import (
     , validate_type_is_assigned_pipeline
 )
 
-coll = get_collection("catalogtypes")
 
 async def create_catalog_type(catalog_type: CatalogType) -> CatalogType:
+    coll = get_async_collection("catalogtypes")
     try:
         catalog_type.description = catalog_type.description.strip().lower()
 
-        existing_type = coll.find_one({"description": catalog_type.description})
+        existing_type = await coll.find_one({"description": catalog_type.description})
         if existing_type:
             raise HTTPException(status_code=400, detail="Catalog type already exists")
 
         catalog_type_dict = catalog_type.model_dump(exclude={"id"})
-        inserted = coll.insert_one(catalog_type_dict)
+        inserted = await coll.insert_one(catalog_type_dict)
+        await invalidate_cache("catalogtypes", "catalogs", "bundles")
         catalog_type.id = str(inserted.inserted_id)
         return catalog_type
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating catalog type: {str(e)}")
 
 async def get_catalog_types() -> list:
+    coll = get_async_collection("catalogtypes")
     try:
         pipeline = get_catalog_type_pipeline()
-        catalog_types = list(coll.aggregate(pipeline))
+        catalog_types = await (await coll.aggregate(pipeline)).to_list()
         return catalog_types
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching catalog types: {str(e)}")
 
 async def get_catalog_type_by_id(catalog_type_id: str) -> CatalogType:
+    coll = get_async_collection("catalogtypes")
     try:
-        doc = coll.find_one({"_id": ObjectId(catalog_type_id)})
+        doc = await coll.find_one({"_id": ObjectId(catalog_type_id)})
         if not doc:
             raise HTTPException(status_code=404, detail="Catalog type not found")
 
@@ -48,41 +52,46 @@ async def get_catalog_type_by_id(catalog_type_id: str) -> CatalogType:
 
 
 async def update_catalog_type(catalog_type_id: str, catalog_type: CatalogType) -> CatalogType:
+    coll = get_async_collection("catalogtypes")
     try:
         catalog_type.description = catalog_type.description.strip().lower()
 
-        existing_type = coll.find_one({"description": catalog_type.description, "_id": {"$ne": ObjectId(catalog_type_id)}})
+        existing_type = await coll.find_one({"description": catalog_type.description, "_id": {"$ne": ObjectId(catalog_type_id)}})
         if existing_type:
             raise HTTPException(status_code=400, detail="Catalog type already exists")
 
-        result = coll.update_one(
+        result = await coll.update_one(
             {"_id": ObjectId(catalog_type_id)},
             {"$set": catalog_type.model_dump(exclude={"id"})}
         )
         if result.modified_count == 0:
             raise HTTPException(status_code=404, detail="Catalog type not found")
 
+        await invalidate_cache("catalogtypes", "catalogs", "bundles")
         return await get_catalog_type_by_id(catalog_type_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error updating catalog type: {str(e)}")
 
 
 async def deactivate_catalog_type(catalog_type_id: str) -> dict:
+    coll = get_async_collection("catalogtypes")
     try:
         pipeline = validate_type_is_assigned_pipeline(catalog_type_id)
-        assigned = list(coll.aggregate(pipeline))
+        assigned = await (await coll.aggregate(pipeline)).to_list()
 
         if assigned is None:
             raise HTTPException(status_code=404, detail="Catalog type not found")
 
         if assigned[0]["number_of_products"] > 0:
-            coll.update_one(
+            await coll.update_one(
                 {"_id": ObjectId(catalog_type_id)},
                 {"$set": {"active": False}}
             )
+            await invalidate_cache("catalogtypes", "catalogs", "bundles")
             return {"message": "Catalog type is assigned to products and has been deactivated"}
         else:
-            coll.delete_one({"_id": ObjectId(catalog_type_id)})
+            await coll.delete_one({"_id": ObjectId(catalog_type_id)})
+            await invalidate_cache("catalogtypes", "catalogs", "bundles")
             return {"message": "Catalog type deleted successfully"}
 
     except Exception as e:
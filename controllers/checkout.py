@@ -0,0 +1,133 @@
+from utils.mongodb import get_async_collection, run_in_transaction
+from utils.order_state_machine import get_state_machine, NOT_ALLOWED, EMPTY_ORDER, UNKNOWN_STATUS
+from bson import ObjectId
+from datetime import datetime
+
+
+# ============================================================================
+# ESTADO ACTUAL DE LA ORDEN
+# ============================================================================
+
+async def load_current_description(order: dict, machine) -> str:
+    """
+    Descripción normalizada del estado actual de la orden.
+    Las órdenes anteriores al backfill de current_status (utils.backfill_orders) no tienen
+    el campo: se toma el registro más reciente de order_status_record (índice id_order_date).
+    Retorna None si la orden no tiene historial de estados.
+    """
+    stored_description = order.get("current_status", {}).get("description")
+    if stored_description is not None:
+        return stored_description.strip().lower()
+
+    latest = await get_async_collection("order_status_record").find_one(
+        {"id_order": order["_id"]},
+        {"id_status": 1},
+        sort=[("date", -1)]
+    )
+    if not latest:
+        return None
+
+    status = machine.status_by_id(latest["id_status"])
+    return status["description"].strip().lower() if status else None
+
+
+# ============================================================================
+# CHECKOUT - FINALIZAR ORDEN (InProgress -> Ordered)
+# ============================================================================
+
+async def checkout_order(order_id: str, requesting_user_id: str) -> dict:
+    """
+    Finalizar la orden del usuario con una lectura y una escritura condicional:
+    - Una lectura por _id de la orden valida dueño, estado actual (current_status) y carrito no vacío (item_count)
+    - Un update_one condicionado al mismo estado hace la transición y el historial se inserta en la misma transacción
+    """
+    orders_collection = get_async_collection("orders")
+    order_status_records_collection = get_async_collection("order_status_record")
+    try:
+        if not ObjectId.is_valid(order_id):
+            return {"success": False, "message": "ID de orden inválido", "data": None}
+
+        if not requesting_user_id:
+            return {"success": False, "message": "Usuario no especificado", "data": None}
+
+        # Estados y transiciones en memoria (sin consulta a order_statuses)
+        machine = await get_state_machine()
+
+        order = await orders_collection.find_one(
+            {"_id": ObjectId(order_id)},
+            {"id_user": 1, "current_status.description": 1, "item_count": 1}
+        )
+        if not order:
+            return {"success": False, "message": "Orden no encontrada", "data": None}
+
+        if str(order["id_user"]) != requesting_user_id:
+            return {"success": False, "message": "No tienes permiso para modificar esta orden", "data": None}
+
+        stored_description = order.get("current_status", {}).get("description")
+        current_description = await load_current_description(order, machine)
+
+        item_count = order.get("item_count")
+        if item_count is None:
+            # Orden anterior al backfill de item_count (utils.backfill_orders): contar las líneas
+            item_count = await get_async_collection("order_details").count_documents({
+                "id_order": ObjectId(order_id),
+                "active": True
+            })
+
+        # Órdenes sin historial de estados se pueden finalizar (igual que antes de current_status)
+        error = machine.check("user", current_description or "inprogress", "ordered", item_count)
+        if error == UNKNOWN_STATUS:
+            return {"success": False, "message": "Estado 'ordered' no encontrado en el sistema", "data": None}
+        if error == NOT_ALLOWED:
+            return {"success": False, "message": "Solo puedes finalizar órdenes en progreso", "data": None}
+        if error == EMPTY_ORDER:
+            return {"success": False, "message": "No puedes finalizar una orden vacía. Agrega al menos un producto antes de finalizar.", "data": None}
+
+        ordered_status = machine.status("ordered")
+
+        # Transición condicionada al estado leído: si otra request la finalizó o vació el carrito, no aplica
+        transition_filter = {
+            "_id": ObjectId(order_id),
+            "current_status.description": stored_description if stored_description is not None else {"$exists": False}
+        }
+        if "item_count" in order:
+            transition_filter["item_count"] = {"$gt": 0}
+
+        now = datetime.utcnow()
+
+        # Transición y registro en el historial en la misma transacción
+        async def transition(session):
+            updated = await orders_collection.update_one(
+                transition_filter,
+                {"$set": {
+                    "current_status": {
+                        "id": ordered_status["_id"],
+                        "description": ordered_status["description"],
+                        "changed_at": now
+                    }
+                }},
+                session=session
+            )
+            if updated.modified_count == 0:
+                return None
+
+            record = await order_status_records_collection.insert_one({
+                "id_order": ObjectId(order_id),
+                "id_status": ordered_status["_id"],
+                "date": now
+            }, session=session)
+            return record.inserted_id
+
+        record_id = await run_in_transaction(transition)
+
+        if record_id is None:
+            return {"success": False, "message": "La orden cambió mientras se finalizaba, intenta de nuevo", "data": None}
+
+        return {
+            "success": True,
+            "message": "Estado de orden actualizado exitosamente",
+            "data": {"id": str(record_id)}
+        }
+
+    except Exception as e:
+        return {"success": False, "message": f"Error: {str(e)}", "data": None}
@@ -1,148 +1,155 @@
-from models.order_details import OrderDetail, CreateOrderDetail, UpdateOrderDetail
+from models.order_details import OrderDetail, CreateOrderDetail, BulkCreateOrderDetails, UpdateOrderDetail
 from pipelines.order_detail_pipelines import (
     get_order_details_pipeline,
     get_order_detail_by_id_pipeline
 )
-from utils.mongodb import get_collection
+from utils.mongodb import get_async_collection
+from utils.reference_cache import get_setting
+from utils.concurrency import fan_out
+from utils.indexes import index_confirmed
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError, BulkWriteError
 from bson import ObjectId
 from datetime import datetime
+import logging
 
-# Conexión a las colecciones
-order_details_collection = get_collection("order_details")
-orders_collection = get_collection("orders")
-catalogs_collection = get_collection("catalogs")
-settings_collection = get_collection("app_settings")
+logger = logging.getLogger(__name__)
 
 # ============================================================================
 # ORDER DETAILS - FUNCIONES HELPER
 # ============================================================================
 
-async def recalculate_order_totals(order_id: str) -> dict:
-    """Recalcular y actualizar los totales de una orden basado en sus detalles activos"""
+DEFAULT_TAX_RATE = 0.01
+
+
+async def get_tax_rate() -> float:
+    """Tasa de impuesto general configurada en app_settings (desde la caché de referencia)"""
+    return await get_setting("general_tax", DEFAULT_TAX_RATE)
+
+
+async def get_detail_unit_price(detail: dict) -> float:
+    """Precio unitario guardado en el detalle (los detalles antiguos sin unit_price usan el costo actual del producto)"""
+    if detail.get("unit_price") is not None:
+        return detail["unit_price"]
+
+    catalogs_collection = get_async_collection("catalogs")
+    product = await catalogs_collection.find_one({"_id": ObjectId(detail["id_producto"])}, {"cost": 1})
+    return product["cost"] if product else 0.0
+
+
+def item_count_delta_expression(delta: int) -> dict:
+    """Sumar delta al item_count de la orden (las órdenes sin item_count lo siguen sin tener hasta el backfill)"""
+    return {"$cond": [
+        {"$eq": [{"$type": "$item_count"}, "missing"]},
+        "$$REMOVE",
+        {"$max": [{"$add": ["$item_count", delta]}, 0]}
+    ]}
+
+
+def order_totals_update(subtotal, tax_rate: float, item_count=None) -> list:
+    """
+    Update con pipeline: fija el subtotal y deriva impuestos y total en la misma escritura.
+    item_count (valor o expresión) mantiene en la orden la cantidad de líneas activas que usa el checkout.
+    """
+    first_stage = {
+        "subtotal": {"$round": [subtotal, 2]},
+        "discount": {"$ifNull": ["$discount", 0.0]},
+        "date_updated": datetime.utcnow()
+    }
+    if item_count is not None:
+        first_stage["item_count"] = item_count
+
+    return [
+        {"$set": first_stage},
+        {"$set": {
+            "taxes": {"$round": [{"$multiply": ["$subtotal", tax_rate]}, 2]}
+        }},
+        {"$set": {
+            "total": {"$round": [{"$subtract": [{"$add": ["$subtotal", "$taxes"]}, "$discount"]}, 2]}
+        }}
+    ]
+
+
+async def write_order_totals(order_id: str, subtotal, item_count=None) -> dict:
+    """Escribir los totales de la orden y retornarlos en la misma operación"""
+    orders_collection = get_async_collection("orders")
+    tax_rate = await get_tax_rate()
+
+    order = await orders_collection.find_one_and_update(
+        {"_id": ObjectId(order_id)},
+        order_totals_update(subtotal, tax_rate, item_count),
+        projection={"subtotal": 1, "taxes": 1, "discount": 1, "total": 1},
+        return_document=ReturnDocument.AFTER
+    )
+
+    if not order:
+        return {"success": False, "message": "Orden no encontrada"}
+
+    return {
+        "success": True,
+        "subtotal": order["subtotal"],
+        "taxes": order["taxes"],
+        "discount": order["discount"],
+        "total": order["total"]
+    }
+
+
+async def apply_order_totals_delta(order_id: str, subtotal_delta: float, item_count_delta: int = 0) -> dict:
+    """
+    Actualizar los totales de forma incremental con el cambio de una línea (precio × cambio de cantidad).
+    item_count_delta: líneas activas agregadas (+) o eliminadas (-) en el mismo cambio.
+
+    El detalle ya se escribió en una operación aparte: si esta escritura falla el delta se pierde,
+    así que se registra el error y se recalculan los totales desde los detalles activos.
+    """
     try:
-        print(f"DEBUG: Recalculando totales para orden: {order_id}")
+        subtotal = {"$max": [{"$add": [{"$ifNull": ["$subtotal", 0.0]}, subtotal_delta]}, 0.0]}
+        item_count = item_count_delta_expression(item_count_delta) if item_count_delta else None
+        return await write_order_totals(order_id, subtotal, item_count)
+
+    except Exception as e:
+        logger.error(f"Error applying totals delta to order {order_id}, recalculating: {str(e)}")
+        return await recalculate_order_totals(order_id)
 
-        # Obtener todos los detalles activos de la orden con información del producto
+
+async def recalculate_order_totals(order_id: str) -> dict:
+    """Recalcular los totales desde todos los detalles activos (ruta de reparación, no se usa en cada cambio)"""
+    order_details_collection = get_async_collection("order_details")
+    try:
         pipeline = [
-            {"$match": {"id_order": order_id, "active": True}},
+            {"$match": {"id_order": ObjectId(order_id), "active": True}},
             {
                 "$lookup": {
                     "from": "catalogs",
-                    "let": {"product_id": {"$toObjectId": "$id_producto"}},
-                    "pipeline": [
-                        {"$match": {"$expr": {"$eq": ["$_id", "$$product_id"]}}}
-                    ],
+                    "localField": "id_producto",
+                    "foreignField": "_id",
                     "as": "product_info"
                 }
             },
             {
-                "$addFields": {
-                    "product": {"$arrayElemAt": ["$product_info", 0]},
-                    "product_price": {"$arrayElemAt": ["$product_info.cost", 0]},
-                    "line_subtotal": {
-                        "$cond": {
-                            "if": {"$gt": [{"$size": "$product_info"}, 0]},
-                            "then": {
-                                "$multiply": [
-                                    "$quantity",
-                                    {"$arrayElemAt": ["$product_info.cost", 0]}
-                                ]
-                            },
-                            "else": 0
+                "$group": {
+                    "_id": None,
+                    "subtotal": {
+                        "$sum": {
+                            "$multiply": [
+                                "$quantity",
+                                {"$ifNull": ["$unit_price", {"$ifNull": [{"$arrayElemAt": ["$product_info.cost", 0]}, 0]}]}
+                            ]
                         }
-                    }
+                    },
+                    "item_count": {"$sum": 1}
                 }
             }
         ]
 
-        # Debug: ver los detalles antes del group
-        debug_result = list(order_details_collection.aggregate(pipeline))
-        print(f"DEBUG: Detalles encontrados: {len(debug_result)}")
-        for detail in debug_result:
-            print(f"DEBUG: Detalle - quantity: {detail.get('quantity')}, product_info: {detail.get('product_info')}, line_subtotal: {detail.get('line_subtotal')}")
-
-        # Ahora hacer el group
-        pipeline.append({
-            "$group": {
-                "_id": None,
-                "subtotal": {"$sum": "$line_subtotal"},
-                "total_items": {"$sum": "$quantity"}
-            }
-        })
-
-        result = list(order_details_collection.aggregate(pipeline))
-        print(f"DEBUG: Resultado del pipeline: {result}")
-
-        if result and result[0]["subtotal"] > 0:
-            subtotal = result[0]["subtotal"]
-
-            # Calcular impuestos (15% por ejemplo - esto puede ser configurable)
-            tax_result = settings_collection.find_one({"key": "general_tax"})
-            if tax_result and "value" in tax_result:
-                tax_rate = tax_result["value"]
-            else:
-                print("DEBUG: No se encontró tasa de impuesto, usando valor por defecto de 0.15")
-                tax_rate = 0.01
-
-            taxes = subtotal * tax_rate
-
-            # Por ahora no hay descuentos automáticos
-            discount = 0.0
-            total = subtotal + taxes - discount
-
-            print(f"DEBUG: Calculando - subtotal: {subtotal}, taxes: {taxes}, total: {total}")
-
-            # Actualizar la orden con los nuevos totales
-            update_result = orders_collection.update_one(
-                {"_id": ObjectId(order_id)},
-                {
-                    "$set": {
-                        "subtotal": round(subtotal, 2),
-                        "taxes": round(taxes, 2),
-                        "discount": discount,
-                        "total": round(total, 2),
-                        "date_updated": datetime.utcnow()
-                    }
-                }
-            )
-
-            print(f"DEBUG: Update result - modified_count: {update_result.modified_count}")
-
-            if update_result.modified_count > 0:
-                return {
-                    "success": True,
-                    "subtotal": round(subtotal, 2),
-                    "taxes": round(taxes, 2),
-                    "discount": discount,
-                    "total": round(total, 2)
-                }
-        else:
-            print("DEBUG: No hay productos o subtotal es 0, reseteando a cero")
-            # La orden no tiene productos, resetear a cero
-            orders_collection.update_one(
-                {"_id": ObjectId(order_id)},
-                {
-                    "$set": {
-                        "subtotal": 0.0,
-                        "taxes": 0.0,
-                        "discount": 0.0,
-                        "total": 0.0,
-                        "date_updated": datetime.utcnow()
-                    }
-                }
-            )
-            return {
-                "success": True,
-                "subtotal": 0.0,
-                "taxes": 0.0,
-                "discount": 0.0,
-                "total": 0.0
-            }
+        result = await (await order_details_collection.aggregate(pipeline)).to_list()
+        subtotal = result[0]["subtotal"] if result else 0.0
+        item_count = result[0]["item_count"] if result else 0
 
-        return {"success": False, "message": "Error al actualizar totales"}
+        return await write_order_totals(order_id, subtotal, item_count)
 
     except Exception as e:
-        print(f"DEBUG: Error en recalculate_order_totals: {str(e)}")
+        logger.error(f"Error en recalculate_order_totals: {str(e)}")
         return {"success": False, "message": f"Error al recalcular totales: {str(e)}"}
 
 
@@ -150,52 +157,114 @@ async def recalculate_order_totals(order_id: str) -> dict:
 # ORDER DETAILS - FUNCIONES DE CREACIÓN
 # ============================================================================
 
-async def create_order_detail(order_id: str, detail_data: CreateOrderDetail, requesting_user_id: str = None, is_admin: bool = False) -> dict:
-    """Crear un nuevo detalle de orden"""
+async def upsert_order_detail_line(order_id: str, product_id: ObjectId, quantity: int, unit_price: float) -> dict:
+    """
+    Sumar cantidad a la línea activa del producto o crearla, en una sola escritura.
+    El índice único parcial {id_order, id_producto} (active: true) garantiza que los
+    adds concurrentes terminen en la misma línea. Retorna la línea resultante.
+    """
+    order_details_collection = get_async_collection("order_details")
+    now = datetime.utcnow()
+
+    def upsert():
+        return order_details_collection.find_one_and_update(
+            {"id_order": ObjectId(order_id), "id_producto": product_id, "active": True},
+            {
+                "$inc": {"quantity": quantity},
+                "$set": {"date_updated": now},
+                "$setOnInsert": {"unit_price": unit_price, "date_created": now}
+            },
+            projection={"quantity": 1, "unit_price": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
+    try:
+        return await upsert()
+    except DuplicateKeyError:
+        # Dos upserts simultáneos insertaron a la vez: el reintento encuentra la línea del otro
+        return await upsert()
+
+
+async def create_order_detail(order_id: str, detail_data: CreateOrderDetail, requesting_user_id: str = None, is_admin: bool = False, increment: bool = False) -> dict:
+    """
+    Crear un nuevo detalle de orden.
+    Con increment=True, si el producto ya está en la orden se suma la cantidad a su línea.
+    """
+    order_details_collection = get_async_collection("order_details")
+    orders_collection = get_async_collection("orders")
+    catalogs_collection = get_async_collection("catalogs")
     try:
         # Validar ObjectId de la orden
         if not ObjectId.is_valid(order_id):
             return {"success": False, "message": "ID de orden inválido", "data": None}
 
+        if not ObjectId.is_valid(detail_data.id_producto):
+            return {"success": False, "message": "ID de producto inválido", "data": None}
+
+        # Orden y producto en paralelo
+        order_info, product_exists = await fan_out(
+            orders_collection.find_one({"_id": ObjectId(order_id)}, {"id_user": 1}),
+            catalogs_collection.find_one({"_id": ObjectId(detail_data.id_producto)}, {"cost": 1})
+        )
+
         # Verificar que la orden existe y pertenece al usuario (si no es admin)
-        order_info = orders_collection.find_one({"_id": ObjectId(order_id)})
         if not order_info:
             return {"success": False, "message": "Orden no encontrada", "data": None}
 
         if not is_admin and requesting_user_id:
-            if order_info["id_user"] != requesting_user_id:
+            if str(order_info["id_user"]) != requesting_user_id:
                 return {"success": False, "message": "No tienes permiso para modificar esta orden", "data": None}
 
-        # Verificar que el producto existe (consulta directa)
-        product_exists = catalogs_collection.find_one({"_id": ObjectId(detail_data.id_producto)})
+        # Verificar que el producto existe
         if not product_exists:
             return {"success": False, "message": "Producto no encontrado", "data": None}
 
-        # Verificar si ya existe un detalle activo para este producto en esta orden (consulta directa)
-        existing_detail = order_details_collection.find_one({
-            "id_order": order_id,  # Usar string directamente
-            "id_producto": detail_data.id_producto,  # Usar string directamente
-            "active": True
-        })
-
-        if existing_detail:
-            return {"success": False, "message": "Este producto ya está en la orden", "data": None}
-
-        # Crear detalle
-        detail_dict = detail_data.model_dump()
-        detail_dict["id_order"] = order_id  # Mantener como string para consistencia
-        detail_dict["id_producto"] = detail_data.id_producto  # Mantener como string para consistencia
-        detail_dict["date_created"] = datetime.utcnow()
-        detail_dict["date_updated"] = datetime.utcnow()
-        detail_dict["active"] = True
-
-        result = order_details_collection.insert_one(detail_dict)
-        
-        if result.inserted_id:
-            # Recalcular totales de la orden después de agregar el producto
-            totals_result = await recalculate_order_totals(order_id)
+        if increment:
+            # Agregar o incrementar en una sola escritura atómica
+            detail = await upsert_order_detail_line(
+                order_id, ObjectId(detail_data.id_producto), detail_data.quantity, product_exists["cost"]
+            )
+            detail_id = detail["_id"]
+            unit_price = detail.get("unit_price")
+            unit_price = unit_price if unit_price is not None else product_exists["cost"]
+            # Las líneas activas tienen cantidad > 0: si quedó igual a la agregada, la línea es nueva
+            new_lines = 1 if detail["quantity"] == detail_data.quantity else 0
+        else:
+            # Crear detalle; el índice único parcial rechaza una segunda línea activa del producto
+            detail_dict = detail_data.model_dump()
+            detail_dict["id_order"] = ObjectId(order_id)
+            detail_dict["id_producto"] = ObjectId(detail_data.id_producto)
+            detail_dict["date_created"] = datetime.utcnow()
+            detail_dict["date_updated"] = datetime.utcnow()
+            detail_dict["active"] = True
+            detail_dict["unit_price"] = product_exists["cost"]
+
+            # Sin el índice confirmado (no se pudo crear o MONGO_ENSURE_INDEXES=false) validar antes de insertar
+            if not index_confirmed("order_details", "id_order_id_producto_active"):
+                existing_detail = await order_details_collection.find_one({
+                    "id_order": ObjectId(order_id),
+                    "id_producto": ObjectId(detail_data.id_producto),
+                    "active": True
+                }, {"_id": 1})
+                if existing_detail:
+                    return {"success": False, "message": "Este producto ya está en la orden", "data": None}
+
+            try:
+                result = await order_details_collection.insert_one(detail_dict)
+            except DuplicateKeyError:
+                return {"success": False, "message": "Este producto ya está en la orden", "data": None}
+            detail_id = result.inserted_id
+            unit_price = product_exists["cost"]
+            new_lines = 1
+
+        if detail_id:
+            # Sumar la cantidad agregada a los totales de la orden
+            totals_result = await apply_order_totals_delta(order_id, unit_price * detail_data.quantity, new_lines)
             
-            response_data = {"id": str(result.inserted_id)}
+            response_data = {"id": str(detail_id)}
+            if increment:
+                response_data["quantity"] = detail["quantity"]
             if totals_result["success"]:
                 response_data["order_totals"] = {
                     "subtotal": totals_result["subtotal"],
@@ -216,29 +285,168 @@ async def create_order_detail(order_id: str, detail_data: CreateOrderDetail, req
         return {"success": False, "message": f"Error: {str(e)}", "data": None}
 
 
+DUPLICATE_KEY = 11000
+
+
+async def bulk_upsert_order_detail_lines(operations: list) -> dict:
+    """
+    Ejecutar los upserts de líneas con bulk_write(ordered=False).
+    Un add concurrente puede insertar la misma línea primero (E11000 en el índice único parcial;
+    Mongo no reintenta porque el filtro incluye active). Esos upserts se reintentan una vez, igual
+    que en upsert_order_detail_line, y ahora encuentran la línea del otro request.
+    Retorna los índices de operaciones que insertaron, las que coincidieron, las que fallaron,
+    y si hubo errores (en ese caso el delta de totales no es confiable).
+    """
+    order_details_collection = get_async_collection("order_details")
+    try:
+        result = await order_details_collection.bulk_write(operations, ordered=False)
+        return {"upserted": set(result.upserted_ids), "matched": result.matched_count, "failed": set(), "clean": True}
+    except BulkWriteError as e:
+        details = e.details
+        upserted = {item["index"] for item in details.get("upserted", [])}
+        matched = details.get("nMatched", 0)
+        duplicates = [error["index"] for error in details["writeErrors"] if error["code"] == DUPLICATE_KEY]
+        failed = {error["index"] for error in details["writeErrors"] if error["code"] != DUPLICATE_KEY}
+        logger.warning(f"Bulk add: {len(duplicates)} concurrent duplicate(s), {len(failed)} other error(s)")
+
+    if duplicates:
+        try:
+            retry = await order_details_collection.bulk_write([operations[i] for i in duplicates], ordered=False)
+            upserted |= {duplicates[i] for i in retry.upserted_ids}
+            matched += retry.matched_count
+        except BulkWriteError as e:
+            details = e.details
+            upserted |= {duplicates[item["index"]] for item in details.get("upserted", [])}
+            matched += details.get("nMatched", 0)
+            failed |= {duplicates[error["index"]] for error in details["writeErrors"]}
+
+    return {"upserted": upserted, "matched": matched, "failed": failed, "clean": False}
+
+
+async def create_order_details_bulk(order_id: str, bulk_data: BulkCreateOrderDetails, requesting_user_id: str = None, is_admin: bool = False) -> dict:
+    """
+    Agregar varios productos a una orden con un número fijo de consultas:
+    una validación de productos con $in, un bulk_write y una sola actualización de totales.
+    Los productos que ya están activos en la orden suman la cantidad a su línea.
+    """
+    order_details_collection = get_async_collection("order_details")
+    orders_collection = get_async_collection("orders")
+    catalogs_collection = get_async_collection("catalogs")
+    try:
+        if not ObjectId.is_valid(order_id):
+            return {"success": False, "message": "ID de orden inválido", "data": None}
+
+        # Consolidar productos repetidos en el request
+        quantities = {}
+        for item in bulk_data.items:
+            if not ObjectId.is_valid(item.id_producto):
+                return {"success": False, "message": f"ID de producto inválido: {item.id_producto}", "data": None}
+            product_id = ObjectId(item.id_producto)
+            quantities[product_id] = quantities.get(product_id, 0) + item.quantity
+
+        # Orden, productos (una sola consulta $in) y precio de las líneas activas existentes, en paralelo
+        order_info, product_docs, existing_docs = await fan_out(
+            orders_collection.find_one({"_id": ObjectId(order_id)}, {"id_user": 1}),
+            catalogs_collection.find({"_id": {"$in": list(quantities)}}, {"cost": 1}).to_list(),
+            order_details_collection.find(
+                {"id_order": ObjectId(order_id), "id_producto": {"$in": list(quantities)}, "active": True},
+                {"id_producto": 1, "unit_price": 1}
+            ).to_list()
+        )
+
+        if not order_info:
+            return {"success": False, "message": "Orden no encontrada", "data": None}
+
+        if not is_admin and requesting_user_id:
+            if str(order_info["id_user"]) != requesting_user_id:
+                return {"success": False, "message": "No tienes permiso para modificar esta orden", "data": None}
+
+        products = {product["_id"]: product for product in product_docs}
+        missing = [str(product_id) for product_id in quantities if product_id not in products]
+        if missing:
+            return {"success": False, "message": f"Producto no encontrado: {', '.join(missing)}", "data": None}
+
+        # El delta usa el precio guardado en cada línea existente
+        existing = {detail["id_producto"]: detail for detail in existing_docs}
+
+        # Agregar o incrementar cada producto con upserts sobre el índice único parcial
+        now = datetime.utcnow()
+        operations = []
+        expected_inserts = set()
+        subtotal_delta = 0.0
+        for index, (product_id, quantity) in enumerate(quantities.items()):
+            operations.append(UpdateOne(
+                {"id_order": ObjectId(order_id), "id_producto": product_id, "active": True},
+                {
+                    "$inc": {"quantity": quantity},
+                    "$set": {"date_updated": now},
+                    "$setOnInsert": {"unit_price": products[product_id]["cost"], "date_created": now}
+                },
+                upsert=True
+            ))
+            unit_price = existing.get(product_id, {}).get("unit_price")
+            if product_id not in existing:
+                expected_inserts.add(index)
+            subtotal_delta += (unit_price if unit_price is not None else products[product_id]["cost"]) * quantity
+
+        result = await bulk_upsert_order_detail_lines(operations)
+
+        # Si hubo errores o alguna línea se creó o eliminó entre la lectura y la escritura el delta no es exacto: recalcular
+        if result["clean"] and result["upserted"] == expected_inserts:
+            totals_result = await apply_order_totals_delta(order_id, subtotal_delta, len(result["upserted"]))
+        else:
+            totals_result = await recalculate_order_totals(order_id)
+
+        response_data = {
+            "inserted": len(result["upserted"]),
+            "incremented": result["matched"]
+        }
+        product_ids = list(quantities)
+        if result["failed"]:
+            response_data["failed"] = [str(product_ids[index]) for index in sorted(result["failed"])]
+        if totals_result["success"]:
+            response_data["order_totals"] = {
+                "subtotal": totals_result["subtotal"],
+                "taxes": totals_result["taxes"],
+                "discount": totals_result["discount"],
+                "total": totals_result["total"]
+            }
+
+        return {
+            "success": True,
+            "message": "Algunos productos no se pudieron agregar a la orden" if result["failed"] else "Productos agregados a la orden exitosamente",
+            "data": response_data
+        }
+
+    except Exception as e:
+        return {"success": False, "message": f"Error: {str(e)}", "data": None}
+
+
 # ============================================================================
 # ORDER DETAILS - FUNCIONES DE CONSULTA
 # ============================================================================
 
 async def get_order_details(order_id: str, requesting_user_id: str = None, is_admin: bool = False) -> dict:
     """Obtener detalles de una orden específica"""
+    order_details_collection = get_async_collection("order_details")
+    orders_collection = get_async_collection("orders")
     try:
         # Validar ObjectId
         if not ObjectId.is_valid(order_id):
             return {"success": False, "message": "ID de orden inválido", "data": None}
 
         # Verificar que la orden existe y permisos
-        order_info = orders_collection.find_one({"_id": ObjectId(order_id)})
+        order_info = await orders_collection.find_one({"_id": ObjectId(order_id)})
         if not order_info:
             return {"success": False, "message": "Orden no encontrada", "data": None}
 
         if not is_admin and requesting_user_id:
-            if order_info["id_user"] != requesting_user_id:
+            if str(order_info["id_user"]) != requesting_user_id:
                 return {"success": False, "message": "No tienes permiso para ver esta orden", "data": None}
 
         # Obtener detalles usando pipeline
         pipeline = get_order_details_pipeline(order_id)
-        details = list(order_details_collection.aggregate(pipeline))
+        details = await (await order_details_collection.aggregate(pipeline)).to_list()
 
         return {
             "success": True,
@@ -260,9 +468,9 @@ async def get_order_details(order_id: str, requesting_user_id: str = None, is_ad
 
 async def update_order_detail(order_id: str, detail_id: str, update_data: UpdateOrderDetail, requesting_user_id: str = None, is_admin: bool = False) -> dict:
     """Actualizar un detalle de orden específico con validación de pertenencia"""
+    order_details_collection = get_async_collection("order_details")
+    orders_collection = get_async_collection("orders")
     try:
-        print(f"DEBUG: Iniciando update_order_detail - order_id: {order_id}, detail_id: {detail_id}")
-        
         # Validar ObjectIds
         if not ObjectId.is_valid(detail_id):
             return {"success": False, "message": "ID de detalle inválido", "data": None}
@@ -271,9 +479,9 @@ async def update_order_detail(order_id: str, detail_id: str, update_data: Update
             return {"success": False, "message": "ID de orden inválido", "data": None}
 
         # Verificar que el detalle existe Y pertenece a la orden especificada
-        detail_info = order_details_collection.find_one({
+        detail_info = await order_details_collection.find_one({
             "_id": ObjectId(detail_id), 
-            "id_order": order_id,  # VALIDACIÓN CRÍTICA: el detalle debe pertenecer a esta orden
+            "id_order": ObjectId(order_id),  # VALIDACIÓN CRÍTICA: el detalle debe pertenecer a esta orden
             "active": True
         })
 
@@ -283,24 +491,24 @@ async def update_order_detail(order_id: str, detail_id: str, update_data: Update
         # Si no es admin, verificar que la orden pertenece al usuario
         if not is_admin and requesting_user_id:
             # Obtener la orden asociada al detalle para verificar permisos
-            order_info = orders_collection.find_one({"_id": ObjectId(order_id)})
-            if not order_info or order_info["id_user"] != requesting_user_id:
+            order_info = await orders_collection.find_one({"_id": ObjectId(order_id)})
+            if not order_info or str(order_info["id_user"]) != requesting_user_id:
                 return {"success": False, "message": "No tienes permiso para modificar este detalle", "data": None}
 
         # Actualizar detalle
         update_dict = update_data.model_dump()
         update_dict["date_updated"] = datetime.utcnow()
 
-        result = order_details_collection.update_one(
-            {"_id": ObjectId(detail_id)},
+        # La cantidad leída es parte del filtro para que el delta de totales sea exacto ante escrituras concurrentes
+        result = await order_details_collection.update_one(
+            {"_id": ObjectId(detail_id), "active": True, "quantity": detail_info["quantity"]},
             {"$set": update_dict}
         )
 
         if result.modified_count > 0:
-            print(f"DEBUG: Detalle actualizado exitosamente, iniciando recálculo de totales")
-            # Recalcular totales de la orden después de actualizar el producto
-            totals_result = await recalculate_order_totals(order_id)
-            print(f"DEBUG: Resultado del recálculo: {totals_result}")
+            # Aplicar a los totales la diferencia de cantidad de la línea
+            unit_price = await get_detail_unit_price(detail_info)
+            totals_result = await apply_order_totals_delta(order_id, unit_price * (update_data.quantity - detail_info["quantity"]))
             
             response_data = {"modified_count": result.modified_count}
             if totals_result["success"]:
@@ -329,6 +537,8 @@ async def update_order_detail(order_id: str, detail_id: str, update_data: Update
 
 async def delete_order_detail(order_id: str, detail_id: str, requesting_user_id: str = None, is_admin: bool = False) -> dict:
     """Eliminar (desactivar) un detalle de orden específico con validación de pertenencia"""
+    order_details_collection = get_async_collection("order_details")
+    orders_collection = get_async_collection("orders")
     try:
         # Validar ObjectIds
         if not ObjectId.is_valid(detail_id):
@@ -338,9 +548,9 @@ async def delete_order_detail(order_id: str, detail_id: str, requesting_user_id:
             return {"success": False, "message": "ID de orden inválido", "data": None}
 
         # Verificar que el detalle existe Y pertenece a la orden especificada
-        detail_info = order_details_collection.find_one({
+        detail_info = await order_details_collection.find_one({
             "_id": ObjectId(detail_id), 
-            "id_order": order_id,  # VALIDACIÓN CRÍTICA: el detalle debe pertenecer a esta orden
+            "id_order": ObjectId(order_id),  # VALIDACIÓN CRÍTICA: el detalle debe pertenecer a esta orden
             "active": True
         })
 
@@ -350,19 +560,20 @@ async def delete_order_detail(order_id: str, detail_id: str, requesting_user_id:
         # Si no es admin, verificar que la orden pertenece al usuario
         if not is_admin and requesting_user_id:
             # Obtener la orden asociada al detalle para verificar permisos
-            order_info = orders_collection.find_one({"_id": ObjectId(order_id)})
-            if not order_info or order_info["id_user"] != requesting_user_id:
+            order_info = await orders_collection.find_one({"_id": ObjectId(order_id)})
+            if not order_info or str(order_info["id_user"]) != requesting_user_id:
                 return {"success": False, "message": "No tienes permiso para modificar este detalle", "data": None}
 
         # Desactivar detalle (soft delete)
-        result = order_details_collection.update_one(
-            {"_id": ObjectId(detail_id)},
+        result = await order_details_collection.update_one(
+            {"_id": ObjectId(detail_id), "active": True},
             {"$set": {"active": False, "date_updated": datetime.utcnow()}}
         )
 
         if result.modified_count > 0:
-            # Recalcular totales de la orden después de eliminar el producto
-            totals_result = await recalculate_order_totals(order_id)
+            # Restar la línea eliminada de los totales de la orden
+            unit_price = await get_detail_unit_price(detail_info)
+            totals_result = await apply_order_totals_delta(order_id, -unit_price * detail_info["quantity"], -1)
 
             response_data = {"modified_count": result.modified_count}
             if totals_result["success"]:
@@ -383,3 +594,29 @@ async def delete_order_detail(order_id: str, detail_id: str, requesting_user_id:
 
     except Exception as e:
         return {"success": False, "message": f"Error: {str(e)}", "data": None}
+
+
+# ============================================================================
+# ORDER DETAILS - FUNCIONES DE REPARACIÓN
+# ============================================================================
+
+async def repair_order_totals(order_id: str) -> dict:
+    """Recalcular completamente los totales de una orden (para corregir desvíos de los totales incrementales)"""
+    if not ObjectId.is_valid(order_id):
+        return {"success": False, "message": "ID de orden inválido", "data": None}
+
+    totals_result = await recalculate_order_totals(order_id)
+
+    if not totals_result["success"]:
+        return {"success": False, "message": totals_result["message"], "data": None}
+
+    return {
+        "success": True,
+        "message": "Totales de la orden recalculados exitosamente",
+        "data": {
+            "subtotal": totals_result["subtotal"],
+            "taxes": totals_result["taxes"],
+            "discount": totals_result["discount"],
+            "total": totals_result["total"]
+        }
+    }
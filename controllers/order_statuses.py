@@ -1,25 +1,27 @@
 from models.order_statuses import OrderStatus
-from utils.mongodb import get_collection
+from utils.mongodb import get_async_collection
+from utils.cache import invalidate_cache
 from fastapi import HTTPException
 from bson import ObjectId
 
-coll = get_collection("order_statuses")
 
 async def create_order_status(order_status: OrderStatus) -> dict:
     """Crear un nuevo order status"""
+    coll = get_async_collection("order_statuses")
     try:
         # Normalizar descripción
         order_status.description = order_status.description.strip().lower()
 
         # Verificar si ya existe un order status con la misma descripción
-        existing = coll.find_one({"description": order_status.description})
+        existing = await coll.find_one({"description": order_status.description})
 
         if existing:
             raise HTTPException(status_code=400, detail="Order status with this description already exists")
 
         # Crear el order status
         order_status_dict = order_status.model_dump(exclude={"id"})
-        inserted = coll.insert_one(order_status_dict)
+        inserted = await coll.insert_one(order_status_dict)
+        await invalidate_cache("order_statuses")
 
         # Retornar el order status creado con su ID
         order_status_dict["id"] = str(inserted.inserted_id)
@@ -32,12 +34,13 @@ async def create_order_status(order_status: OrderStatus) -> dict:
 
 async def get_order_statuses() -> dict:
     """Obtener todos los order statuses"""
+    coll = get_async_collection("order_statuses")
     try:
         # Obtener todos los order statuses directamente
         order_statuses_cursor = coll.find({})
         order_statuses = []
         
-        for status in order_statuses_cursor:
+        async for status in order_statuses_cursor:
             status["id"] = str(status["_id"])
             del status["_id"]
             order_statuses.append(status)
@@ -52,13 +55,14 @@ async def get_order_statuses() -> dict:
 
 async def get_order_status_by_id(order_status_id: str) -> dict:
     """Obtener un order status por ID"""
+    coll = get_async_collection("order_statuses")
     try:
         # Validar ObjectId
         if not ObjectId.is_valid(order_status_id):
             raise HTTPException(status_code=400, detail="Invalid order status ID")
         
         # Buscar el order status directamente
-        order_status = coll.find_one({"_id": ObjectId(order_status_id)})
+        order_status = await coll.find_one({"_id": ObjectId(order_status_id)})
         
         if not order_status:
             raise HTTPException(status_code=404, detail="Order status not found")
@@ -76,13 +80,14 @@ async def get_order_status_by_id(order_status_id: str) -> dict:
 
 async def update_order_status(order_status_id: str, order_status: OrderStatus) -> dict:
     """Actualizar un order status"""
+    coll = get_async_collection("order_statuses")
     try:
         # Validar ObjectId
         if not ObjectId.is_valid(order_status_id):
             raise HTTPException(status_code=400, detail="Invalid order status ID")
 
         # Verificar que el order status existe
-        existing = coll.find_one({"_id": ObjectId(order_status_id)})
+        existing = await coll.find_one({"_id": ObjectId(order_status_id)})
 
         if not existing:
             raise HTTPException(status_code=404, detail="Order status not found")
@@ -91,7 +96,7 @@ async def update_order_status(order_status_id: str, order_status: OrderStatus) -
         order_status.description = order_status.description.strip().lower()
 
         # Verificar si ya existe otro order status con la misma descripción
-        duplicate = coll.find_one({
+        duplicate = await coll.find_one({
             "description": order_status.description,
             "_id": {"$ne": ObjectId(order_status_id)}
         })
@@ -101,7 +106,7 @@ async def update_order_status(order_status_id: str, order_status: OrderStatus) -
 
         # Actualizar el order status
         order_status_dict = order_status.model_dump(exclude={"id"})
-        result = coll.update_one(
+        result = await coll.update_one(
             {"_id": ObjectId(order_status_id)},
             {"$set": order_status_dict}
         )
@@ -109,6 +114,8 @@ async def update_order_status(order_status_id: str, order_status: OrderStatus) -
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Order status not found")
 
+        await invalidate_cache("order_statuses")
+
         # Retornar el order status actualizado
         order_status_dict["id"] = order_status_id
         return order_status_dict
@@ -120,23 +127,26 @@ async def update_order_status(order_status_id: str, order_status: OrderStatus) -
 
 async def delete_order_status(order_status_id: str) -> dict:
     """Eliminar un order status"""
+    coll = get_async_collection("order_statuses")
     try:
         # Validar ObjectId
         if not ObjectId.is_valid(order_status_id):
             raise HTTPException(status_code=400, detail="Invalid order status ID")
 
         # Obtener el order status antes de eliminarlo
-        order_status = coll.find_one({"_id": ObjectId(order_status_id)})
+        order_status = await coll.find_one({"_id": ObjectId(order_status_id)})
 
         if not order_status:
             raise HTTPException(status_code=404, detail="Order status not found")
 
         # Eliminar el order status
-        result = coll.delete_one({"_id": ObjectId(order_status_id)})
+        result = await coll.delete_one({"_id": ObjectId(order_status_id)})
 
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Order status not found")
 
+        await invalidate_cache("order_statuses")
+
         # Convertir ObjectId a string para la respuesta
         order_status["id"] = str(order_status["_id"])
         del order_status["_id"]
@@ -3,19 +3,52 @@ from models.order_status_records import OrderStatusRecord, CreateOrderStatusReco
 from pipelines.order_pipelines import (
     get_all_orders_pipeline,
     get_orders_by_user_pipeline,
+    get_orders_keyset_pipeline,
     get_order_by_id_pipeline,
-    get_order_owner_pipeline,
-    get_existing_inprogress_order_pipeline
+    get_order_owner_pipeline
 )
-from utils.mongodb import get_collection
+from utils.mongodb import get_async_collection, run_in_transaction
+from utils.order_state_machine import get_state_machine, NOT_ALLOWED, EMPTY_ORDER
+from utils.streaming import STREAM_BATCH_SIZE
+from utils.concurrency import fan_out
+from controllers.checkout import checkout_order, load_current_description
 from bson import ObjectId
 from datetime import datetime
+import base64
 
-# Conexión a las colecciones
-orders_collection = get_collection("orders")
-users_collection = get_collection("users")
-order_status_records_collection = get_collection("order_status_record")  # Historial de cambios de estado
-order_statuses_collection = get_collection("order_statuses")  # Catálogo de estados disponibles
+
+# ============================================================================
+# ORDERS - FUNCIONES HELPER
+# ============================================================================
+
+def format_order_summary(order: dict) -> dict:
+    """Formato de respuesta de una orden sin detalles (usado al crear/recuperar el carrito)"""
+    return {
+        "_id": str(order["_id"]),
+        "id_user": str(order["id_user"]),
+        "date": order["date"],
+        "subtotal": order.get("subtotal", 0.0),
+        "taxes": order.get("taxes", 0.0),
+        "discount": order.get("discount", 0.0),
+        "total": order.get("total", 0.0),
+        "status": order.get("current_status", {}).get("description")
+    }
+
+
+def encode_orders_cursor(order: dict) -> str:
+    """Cursor opaco (date + _id) de la última orden de una página"""
+    raw = f"{order['date'].isoformat()}|{order['id']}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_orders_cursor(cursor: str):
+    """Retorna (date, ObjectId) de un cursor, o None si el cursor no es válido"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        date_str, order_id = raw.split("|")
+        return datetime.fromisoformat(date_str), ObjectId(order_id)
+    except Exception:
+        return None
 
 
 # ============================================================================
@@ -24,66 +57,80 @@ order_statuses_collection = get_collection("order_statuses")  # Catálogo de est
 
 async def create_order(order_data: CreateOrder, user_id: str) -> dict:
     """Crear una nueva orden o retornar la existente en 'inprogress'"""
+    orders_collection = get_async_collection("orders")
+    users_collection = get_async_collection("users")
+    order_status_records_collection = get_async_collection("order_status_record")
     try:
         # Validar que el usuario existe (consulta directa más simple)
-        user_exists = users_collection.find_one({"_id": ObjectId(user_id)})
+        user_exists = await users_collection.find_one({"_id": ObjectId(user_id)})
         if not user_exists:
             return {"success": False, "message": "Usuario no encontrado", "data": None}
 
-        # Verificar si ya existe una orden en "inprogress" (aquí sí necesitamos pipeline por el lookup)
-        existing_order = list(orders_collection.aggregate(get_existing_inprogress_order_pipeline(user_id)))
+        # Verificar si ya existe una orden en "inprogress" (índice id_user + current_status.description)
+        existing_order = await orders_collection.find_one({
+            "id_user": ObjectId(user_id),
+            "current_status.description": "inprogress"
+        })
+
+        if not existing_order:
+            # Órdenes sin current_status (anteriores al backfill): su estado está en el historial
+            machine = await get_state_machine()
+            legacy_orders = await orders_collection.find({
+                "id_user": ObjectId(user_id),
+                "current_status": {"$exists": False}
+            }).to_list()
+            for legacy_order in legacy_orders:
+                if await load_current_description(legacy_order, machine) == "inprogress":
+                    existing_order = legacy_order
+                    break
 
         if existing_order:
             return {
                 "success": True,
                 "message": "Ya tienes una orden en progreso",
-                "data": existing_order[0]
+                "data": format_order_summary(existing_order)
             }
 
-        # Crear nueva orden vacía (sin subtotal, taxes, etc.)
+        # Estado inicial "InProgress"
+        initial_status = (await get_state_machine()).status("inprogress")
+        if not initial_status:
+            return {"success": False, "message": "Estado 'inprogress' no encontrado en el sistema", "data": None}
+
+        # Crear nueva orden vacía (sin subtotal, taxes, etc.) con su estado actual desnormalizado
+        now = datetime.utcnow()
         order_dict = {
-            "id_user": user_id,  # Mantener como string para consistencia
-            "date": datetime.utcnow(),
+            "_id": ObjectId(),
+            "id_user": ObjectId(user_id),
+            "date": now,
             "subtotal": 0.0,
             "taxes": 0.0,
             "discount": 0.0,
-            "total": 0.0
+            "total": 0.0,
+            "item_count": 0,
+            "current_status": {
+                "id": initial_status["_id"],
+                "description": "inprogress",
+                "changed_at": now
+            }
         }
 
-        result = orders_collection.insert_one(order_dict)
-
-        if result.inserted_id:
-            # Crear estado inicial "InProgress" automáticamente
-            initial_status = list(order_statuses_collection.aggregate([
-                {"$match": {"description": "inprogress"}},
-                {"$project": {"_id": 1}},
-                {"$limit": 1}
-            ]))
-
-            if initial_status:
-                status_data = {
-                    "id_order": str(result.inserted_id),  # Convertir a string para consistencia
-                    "id_status": str(initial_status[0]["_id"]),  # Convertir a string para consistencia
-                    "date": datetime.utcnow()
-                }
-                order_status_records_collection.insert_one(status_data)
-
-            # Retornar la orden creada con formato similar al existente
-            created_order = {
-                "_id": str(result.inserted_id),
-                "id_user": user_id,
-                "date": order_dict["date"],
-                "subtotal": 0.0,
-                "taxes": 0.0,
-                "discount": 0.0,
-                "total": 0.0,
-                "status": "inprogress"
-            }
+        # La orden y su registro inicial en el historial se escriben en la misma transacción
+        async def insert_order(session):
+            await orders_collection.insert_one(order_dict, session=session)
+            await order_status_records_collection.insert_one({
+                "id_order": order_dict["_id"],
+                "id_status": initial_status["_id"],
+                "date": now
+            }, session=session)
+            return order_dict["_id"]
+
+        inserted_id = await run_in_transaction(insert_order)
 
+        if inserted_id:
             return {
                 "success": True,
                 "message": "Orden creada exitosamente",
-                "data": created_order
+                "data": format_order_summary(order_dict)
             }
 
         return {"success": False, "message": "Error al crear la orden", "data": None}
@@ -96,49 +143,90 @@ async def create_order(order_data: CreateOrder, user_id: str) -> dict:
 # ORDERS - FUNCIONES DE CONSULTA
 # ============================================================================
 
-async def get_orders(skip: int = 0, limit: int = 50, user_id: str = None) -> dict:
-    """Obtener órdenes (todas o de un usuario específico)"""
+async def get_orders(skip: int = 0, limit: int = 50, user_id: str = None, cursor: str = None, use_cursor: bool = False, include_total: bool = True) -> dict:
+    """
+    Obtener órdenes (todas o de un usuario específico)
+    - Por offset (skip/limit) o por cursor (use_cursor / cursor de la página anterior)
+    - El total es opcional; para todas las órdenes es un estimado de los metadatos de la colección
+    """
+    orders_collection = get_async_collection("orders")
+    users_collection = get_async_collection("users")
     try:
         if user_id:
             # Validar que el usuario existe (consulta directa)
-            user_exists = users_collection.find_one({"_id": ObjectId(user_id)})
+            user_exists = await users_collection.find_one({"_id": ObjectId(user_id)})
             if not user_exists:
                 return {"success": False, "message": "Usuario no encontrado", "data": None}
-            
-            pipeline = get_orders_by_user_pipeline(user_id, skip, limit)
+
+        # Se pide un registro extra para saber si hay más páginas sin contar
+        if use_cursor or cursor:
+            after_date, after_id = None, None
+            if cursor:
+                decoded = decode_orders_cursor(cursor)
+                if decoded is None:
+                    return {"success": False, "message": "Cursor inválido", "data": None}
+                after_date, after_id = decoded
+
+            pipeline = get_orders_keyset_pipeline(user_id, after_date, after_id, limit + 1)
+        elif user_id:
+            pipeline = get_orders_by_user_pipeline(user_id, skip, limit + 1)
         else:
-            pipeline = get_all_orders_pipeline(skip, limit)
-        
-        orders = list(orders_collection.aggregate(pipeline))
+            pipeline = get_all_orders_pipeline(skip, limit + 1)
         
-        # Contar total de documentos
-        if user_id:
-            total = orders_collection.count_documents({"id_user": user_id})  # Buscar por string
+        orders = await (await orders_collection.aggregate(pipeline)).to_list()
+        has_more = len(orders) > limit
+        orders = orders[:limit]
+
+        data = {
+            "orders": orders,
+            "limit": limit,
+            "has_more": has_more
+        }
+
+        if use_cursor or cursor:
+            data["next_cursor"] = encode_orders_cursor(orders[-1]) if has_more else None
         else:
-            total = orders_collection.count_documents({})
+            data["skip"] = skip
+        
+        # Contar total de documentos (opcional)
+        if include_total:
+            if user_id:
+                data["total"] = await orders_collection.count_documents({"id_user": ObjectId(user_id)})
+            else:
+                data["total"] = await orders_collection.estimated_document_count()
+                data["total_estimated"] = True
         
         return {
             "success": True,
             "message": "Órdenes obtenidas exitosamente",
-            "data": {
-                "orders": orders,
-                "total": total,
-                "skip": skip,
-                "limit": limit,
-                "has_more": skip + len(orders) < total
-            }
+            "data": data
         }
     
     except Exception as e:
         return {"success": False, "message": f"Error: {str(e)}", "data": None}
 
 
+async def open_orders_cursor(user_id: str = None) -> dict:
+    """
+    Cursor sobre todas las órdenes (o las de un usuario) para exportarlas en streaming.
+    Se lee por lotes de STREAM_BATCH_SIZE en lugar de materializar el listado.
+    """
+    try:
+        orders_coll = get_async_collection("orders")
+        pipeline = get_orders_keyset_pipeline(user_id, limit=None)
+        cursor = await orders_coll.aggregate(pipeline, batchSize=STREAM_BATCH_SIZE)
+        return {"success": True, "message": "Cursor abierto", "data": cursor}
+    except Exception as e:
+        return {"success": False, "message": f"Error: {str(e)}", "data": None}
+
+
 # ============================================================================
 # ORDERS - FUNCIONES DE CONSULTA ESPECÍFICA
 # ============================================================================
 
 async def get_order_by_id(order_id: str, requesting_user_id: str = None, is_admin: bool = False) -> dict:
     """Obtener una orden específica por ID"""
+    orders_collection = get_async_collection("orders")
     try:
         # Validar ObjectId
         if not ObjectId.is_valid(order_id):
@@ -146,7 +234,7 @@ async def get_order_by_id(order_id: str, requesting_user_id: str = None, is_admi
 
         # Si no es admin, verificar que la orden pertenece al usuario
         if not is_admin and requesting_user_id:
-            owner_result = list(orders_collection.aggregate(get_order_owner_pipeline(order_id)))
+            owner_result = await (await orders_collection.aggregate(get_order_owner_pipeline(order_id))).to_list()
             if not owner_result:
                 return {"success": False, "message": "Orden no encontrada", "data": None}
 
@@ -155,7 +243,7 @@ async def get_order_by_id(order_id: str, requesting_user_id: str = None, is_admi
 
         # Obtener orden con detalles completos
         pipeline = get_order_by_id_pipeline(order_id)
-        orders = list(orders_collection.aggregate(pipeline))
+        orders = await (await orders_collection.aggregate(pipeline)).to_list()
 
         if not orders:
             return {"success": False, "message": "Orden no encontrada", "data": None}
@@ -175,94 +263,97 @@ async def get_order_by_id(order_id: str, requesting_user_id: str = None, is_admi
 # ============================================================================
 
 async def update_order_status(order_id: str, order_status_id: str = None, requesting_user_id: str = None, is_admin: bool = False) -> dict:
-    """Actualizar el estado de una orden (solo para users si es su orden, o admins)"""
+    """Actualizar el estado de una orden (users: solo finalizar su orden vía checkout; admins: cualquier estado)"""
+    if not is_admin:
+        return await checkout_order(order_id, requesting_user_id)
+
+    orders_collection = get_async_collection("orders")
+    order_status_records_collection = get_async_collection("order_status_record")
     try:
         # Validar ObjectId
         if not ObjectId.is_valid(order_id):
             return {"success": False, "message": "ID de orden inválido", "data": None}
 
-        # Verificar que la orden existe
-        order_exists = orders_collection.find_one({"_id": ObjectId(order_id)})
+        if not order_status_id:
+            return {"success": False, "message": "Estado de orden no especificado", "data": None}
+
+        if not ObjectId.is_valid(order_status_id):
+            return {"success": False, "message": "ID de estado inválido", "data": None}
+
+        # Orden (con estado actual e item_count) y máquina de estados en memoria, en paralelo
+        order_exists, machine = await fan_out(
+            orders_collection.find_one({"_id": ObjectId(order_id)}, {"current_status.description": 1, "item_count": 1}),
+            get_state_machine()
+        )
+
         if not order_exists:
             return {"success": False, "message": "Orden no encontrada", "data": None}
 
-        # Si no es admin, verificar permisos y restricciones
-        if not is_admin:
-            if not requesting_user_id:
-                return {"success": False, "message": "Usuario no especificado", "data": None}
-
-            # Verificar que la orden pertenece al usuario
-            if order_exists["id_user"] != requesting_user_id:
-                return {"success": False, "message": "No tienes permiso para modificar esta orden", "data": None}
+        status_exists = machine.status_by_id(order_status_id)
+        if not status_exists:
+            return {"success": False, "message": "Estado de orden no encontrado", "data": None}
 
-            # Verificar que el estado actual es "InProgress"
-            current_status = order_status_records_collection.find_one(
-                {"id_order": order_id},  # Buscar por string directamente
-                sort=[("date", -1)]
-            )
+        status_description = status_exists["description"].strip().lower()
+        stored_description = order_exists.get("current_status", {}).get("description")
+        current_description = await load_current_description(order_exists, machine)
 
-            if current_status:
-                current_status_info = order_statuses_collection.find_one({"_id": ObjectId(current_status["id_status"])})
-                if current_status_info and current_status_info["description"] != "inprogress":
-                    return {"success": False, "message": "Solo puedes finalizar órdenes en progreso", "data": None}
-
-            # Para usuarios, automáticamente buscar el estado "ordered"
-            if order_status_id is None:
-                ordered_status = order_statuses_collection.find_one({"description": "ordered"})
-                if not ordered_status:
-                    return {"success": False, "message": "Estado 'ordered' no encontrado en el sistema", "data": None}
-                order_status_id = str(ordered_status["_id"])
-
-            # VALIDACIÓN CRÍTICA: Verificar que la orden tenga productos antes de finalizar
-            order_details_collection = get_collection("order_details")
-            active_products = order_details_collection.count_documents({
-                "id_order": order_id,
+        active_products = order_exists.get("item_count")
+        if active_products is None and status_description in machine.requires_products:
+            # Orden anterior al backfill de item_count
+            active_products = await get_async_collection("order_details").count_documents({
+                "id_order": ObjectId(order_id),
                 "active": True
             })
 
-            if active_products == 0:
-                return {"success": False, "message": "No puedes finalizar una orden vacía. Agrega al menos un producto antes de finalizar.", "data": None}
-
-        # Para admins, validar que el estado existe si se proporciona
-        if order_status_id:
-            if not ObjectId.is_valid(order_status_id):
-                return {"success": False, "message": "ID de estado inválido", "data": None}
-
-            status_exists = order_statuses_collection.find_one({"_id": ObjectId(order_status_id)})
-            if not status_exists:
-                return {"success": False, "message": "Estado de orden no encontrado", "data": None}
-
-            # VALIDACIÓN PARA ADMINS: También verificar productos para ciertos estados
-            status_description = status_exists.get("description", "").lower()
-            states_requiring_products = ["ordered", "shipped", "delivered", "processing"]
-
-            if status_description in states_requiring_products:
-                order_details_collection = get_collection("order_details")
-                active_products = order_details_collection.count_documents({
-                    "id_order": order_id,
-                    "active": True
-                })
-
-                if active_products == 0:
-                    return {"success": False, "message": f"No se puede cambiar a '{status_description}' una orden vacía. La orden debe tener al menos un producto.", "data": None}
-
-        # Crear nuevo registro de estado
-        status_data = {
-            "id_order": order_id,  # Ya viene como string del parámetro
-            "id_status": order_status_id,  # Ya viene como string del parámetro
-            "date": datetime.utcnow()
+        error = machine.check("admin", current_description, status_description, active_products)
+        if error == NOT_ALLOWED:
+            return {"success": False, "message": f"Transición no permitida: '{current_description}' -> '{status_description}'", "data": None}
+        if error == EMPTY_ORDER:
+            return {"success": False, "message": f"No se puede cambiar a '{status_description}' una orden vacía. La orden debe tener al menos un producto.", "data": None}
+
+        # Transición condicionada al estado validado: un checkout u otro cambio concurrente no se sobrescribe
+        transition_filter = {
+            "_id": ObjectId(order_id),
+            "current_status.description": stored_description if stored_description is not None else {"$exists": False}
         }
+        if status_description in machine.requires_products and "item_count" in order_exists:
+            transition_filter["item_count"] = {"$gt": 0}
+
+        now = datetime.utcnow()
+
+        # Estado actual desnormalizado e historial en la misma transacción
+        async def transition(session):
+            updated = await orders_collection.update_one(
+                transition_filter,
+                {"$set": {
+                    "current_status": {
+                        "id": status_exists["_id"],
+                        "description": status_exists["description"],
+                        "changed_at": now
+                    }
+                }},
+                session=session
+            )
+            if updated.modified_count == 0:
+                return None
 
-        result = order_status_records_collection.insert_one(status_data)
+            record = await order_status_records_collection.insert_one({
+                "id_order": ObjectId(order_id),
+                "id_status": ObjectId(order_status_id),
+                "date": now
+            }, session=session)
+            return record.inserted_id
 
-        if result.inserted_id:
-            return {
-                "success": True,
-                "message": "Estado de orden actualizado exitosamente",
-                "data": {"id": str(result.inserted_id)}
-            }
+        record_id = await run_in_transaction(transition)
+
+        if record_id is None:
+            return {"success": False, "message": "La orden cambió mientras se actualizaba su estado, intenta de nuevo", "data": None}
 
-        return {"success": False, "message": "Error al actualizar el estado", "data": None}
+        return {
+            "success": True,
+            "message": "Estado de orden actualizado exitosamente",
+            "data": {"id": str(record_id)}
+        }
 
     except Exception as e:
         return {"success": False, "message": f"Error: {str(e)}", "data": None}
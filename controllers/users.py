@@ -1,28 +1,42 @@
 import os
 import json
+import asyncio
 import logging
-import firebase_admin
-import requests
+import httpx
+import jwt
 import base64
 from fastapi import HTTPException
-from firebase_admin import credentials, auth as firebase_auth
-from dotenv import load_dotenv
 
-from models.users import User
-from models.login import Login
+from bson import ObjectId
 
-from utils.security import create_jwt_token
-from utils.mongodb import get_collection
+from models.users import User, UpdateUserAccess
+from models.login import Login, FirebaseLogin, RefreshTokenRequest
 
-load_dotenv()
+from utils.security import create_jwt_token
+from utils.mongodb import get_async_collection
+from utils.http_client import request_with_retry
+from utils.firebase_tokens import verify_firebase_id_token
+from utils.refresh_tokens import (
+    user_claims,
+    issue_refresh_token,
+    rotate_refresh_token,
+    revoke_refresh_token,
+    revoke_user_sessions
+)
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
 def initialize_firebase():
+    """
+    Inicializar firebase_admin la primera vez que se necesita y retornar su módulo auth.
+    El import también es diferido: firebase_admin y las librerías de Google pesan en el arranque.
+    """
+    import firebase_admin
+    from firebase_admin import credentials, auth as firebase_auth
+
     if firebase_admin._apps:
-        return
+        return firebase_auth
 
     try:
         firebase_creds_base64 = os.getenv("FIREBASE_CREDENTIALS_BASE64")
@@ -43,11 +57,13 @@ def initialize_firebase():
         logger.error(f"Failed to initialize Firebase: {e}")
         raise HTTPException(status_code=500, detail=f"Firebase configuration error: {str(e)}")
 
+    return firebase_auth
 
-initialize_firebase()
 
 async def create_user( user: User ) -> User:
 
+    firebase_auth = initialize_firebase()
+
     user_record = {}
     try:
         user_record = firebase_auth.create_user(
@@ -62,7 +78,7 @@ async def create_user( user: User ) -> User:
         )
 
     try:
-        coll = get_collection("users")
+        coll = get_async_collection("users")
 
         new_user = User(
             name=user.name
@@ -72,7 +88,7 @@ async def create_user( user: User ) -> User:
         )
 
         user_dict = new_user.model_dump(exclude={"id", "password"})
-        inserted = coll.insert_one(user_dict)
+        inserted = await coll.insert_one(user_dict)
         new_user.id = str(inserted.inserted_id)
         new_user.password = "*********"  # Mask the password in the response
         return new_user
@@ -83,17 +99,50 @@ async def create_user( user: User ) -> User:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 
-async def login(user: Login) -> dict:
+async def create_session(user_info: dict) -> dict:
+    """Access token (JWT de 1 hora) más un refresh token para renovarlo sin volver a autenticar"""
+    claims = user_claims(user_info)
+    return {
+        "message": "Usuario Autenticado correctamente"
+        , "idToken": create_jwt_token(**claims)
+        , "refreshToken": await issue_refresh_token(claims)
+    }
+
+
+async def firebase_sign_in(email: str, password: str) -> dict:
     api_key = os.getenv("FIREBASE_API_KEY")
     url = f"https://identitytoolkit.googleapis.com/v1/accounts:signInWithPassword?key={api_key}"
     payload = {
-        "email": user.email
-        , "password": user.password
+        "email": email
+        , "password": password
         , "returnSecureToken": True
     }
 
-    response = requests.post(url, json=payload)
-    response_data = response.json()
+    response = await request_with_retry("POST", url, json=payload)
+
+    # 5xx tras agotar los reintentos: Firebase no disponible (los 4xx traen el error de credenciales en JSON)
+    if response.status_code >= 500:
+        response.raise_for_status()
+
+    return response.json()
+
+
+async def login(user: Login) -> dict:
+    coll = get_async_collection("users")
+
+    # La validación en Firebase y la búsqueda del usuario en Mongo corren en paralelo
+    try:
+        response_data, user_info = await asyncio.gather(
+            firebase_sign_in(user.email, user.password)
+            , coll.find_one({ "email": user.email })
+        )
+    except (httpx.HTTPError, ValueError) as e:
+        # ValueError: cuerpo que no es JSON (p. ej. una página de error de un proxy)
+        logger.error(f"Firebase sign-in request failed: {e}")
+        raise HTTPException(
+            status_code=503
+            , detail="Servicio de autenticación no disponible"
+        )
 
     if "error" in response_data:
         raise HTTPException(
@@ -101,8 +150,61 @@ async def login(user: Login) -> dict:
             , detail="Error al autenticar usuario"
         )
 
-    coll = get_collection("users")
-    user_info = coll.find_one({ "email": user.email })
+    if not user_info:
+        raise HTTPException(
+            status_code=404
+            , detail="Usuario no encontrado en la base de datos"
+        )
+
+    return await create_session(user_info)
+
+
+async def find_user_by_email(email: str) -> dict:
+    """
+    Buscar el usuario por email sin distinguir mayúsculas.
+    Firebase entrega el email en minúsculas y los usuarios pudieron registrarse con mayúsculas:
+    primero la búsqueda exacta (índice email) y, si no hay resultado, con collation de nivel 2.
+    """
+    coll = get_async_collection("users")
+    user_info = await coll.find_one({ "email": email })
+    if user_info:
+        return user_info
+    return await coll.find_one({ "email": email }, collation={"locale": "en", "strength": 2})
+
+
+async def login_firebase(data: FirebaseLogin) -> dict:
+    """Login con un ID token de Firebase verificado localmente, sin llamada a Google por request"""
+    try:
+        claims = await verify_firebase_id_token(data.id_token)
+    except jwt.InvalidTokenError as e:
+        logger.info(f"Invalid Firebase ID token: {e}")
+        raise HTTPException(
+            status_code=401
+            , detail="Token de Firebase inválido"
+        )
+    except (httpx.HTTPError, ValueError) as e:
+        logger.error(f"Firebase ID token verification unavailable: {e}")
+        raise HTTPException(
+            status_code=503
+            , detail="Servicio de autenticación no disponible"
+        )
+
+    email = claims.get("email")
+    if not email:
+        raise HTTPException(
+            status_code=401
+            , detail="El token de Firebase no contiene email"
+        )
+
+    # Proveedores federados pueden traer emails no verificados: solo se aceptan verificados o de email/contraseña
+    sign_in_provider = claims.get("firebase", {}).get("sign_in_provider")
+    if not claims.get("email_verified") and sign_in_provider != "password":
+        raise HTTPException(
+            status_code=403
+            , detail="El email de la cuenta de Firebase no está verificado"
+        )
+
+    user_info = await find_user_by_email(email)
 
     if not user_info:
         raise HTTPException(
@@ -110,14 +212,61 @@ async def login(user: Login) -> dict:
             , detail="Usuario no encontrado en la base de datos"
         )
 
+    return await create_session(user_info)
+
+
+async def refresh_session(data: RefreshTokenRequest) -> dict:
+    """Renovar el access token; solo consulta refresh_tokens (sin Firebase ni users)"""
+    rotated = await rotate_refresh_token(data.refresh_token)
+    if rotated is None:
+        raise HTTPException(
+            status_code=401
+            , detail="Refresh token inválido o expirado"
+        )
+
+    new_refresh_token, claims = rotated
     return {
-        "message": "Usuario Autenticado correctamente"
-        , "idToken": create_jwt_token(
-            user_info["name"]
-            , user_info["lastname"]
-            , user_info["email"]
-            , user_info["active"]
-            , user_info["admin"]
-            , str(user_info["_id"])
-        )
-    }
\ No newline at end of file
+        "message": "Token renovado correctamente"
+        , "idToken": create_jwt_token(**claims)
+        , "refreshToken": new_refresh_token
+    }
+
+
+async def revoke_session(data: RefreshTokenRequest) -> dict:
+    if not await revoke_refresh_token(data.refresh_token):
+        raise HTTPException(
+            status_code=404
+            , detail="Refresh token no encontrado"
+        )
+    return {"message": "Sesión cerrada correctamente"}
+
+
+async def update_user_access(user_id: str, data: UpdateUserAccess) -> dict:
+    """Cambiar active/admin de un usuario y revocar sus refresh tokens para que el cambio aplique de inmediato"""
+    if not ObjectId.is_valid(user_id):
+        raise HTTPException(
+            status_code=400
+            , detail="ID de usuario inválido"
+        )
+
+    changes = data.model_dump(exclude_none=True)
+    if not changes:
+        raise HTTPException(
+            status_code=400
+            , detail="No hay cambios para aplicar"
+        )
+
+    coll = get_async_collection("users")
+    result = await coll.update_one({ "_id": ObjectId(user_id) }, { "$set": changes })
+
+    if result.matched_count == 0:
+        raise HTTPException(
+            status_code=404
+            , detail="Usuario no encontrado en la base de datos"
+        )
+
+    revoked = await revoke_user_sessions(user_id) if result.modified_count else 0
+    return {
+        "message": "Usuario actualizado correctamente"
+        , "revoked_tokens": revoked
+    }
@@ -0,0 +1,43 @@
+"""
+Configuración de producción: gunicorn como process manager con workers de uvicorn
+
+    gunicorn main:app -c gunicorn.conf.py
+
+Cada worker es un proceso con su propio event loop (uvloop + httptools vía
+uvicorn[standard]) y su propio pool de MongoDB; el tamaño del pool por worker se
+deriva de MONGO_TOTAL_MAX_CONNECTIONS / WEB_CONCURRENCY (ver utils/mongodb.py).
+
+Con más de un worker se necesita REDIS_URL: la caché y sus invalidaciones se
+comparten por Redis (ver utils/cache.py). Sin REDIS_URL cada worker tendría su
+propia caché en memoria y uno podría servir datos viejos tras una escritura en
+otro, por eso el valor por defecto es entonces un solo worker.
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+# Cantidad fija por defecto: en contenedores cpu_count() reporta los núcleos del host, no los
+# asignados, y cada worker suma un pool de MongoDB. La app es I/O bound y async: pocos workers bastan
+DEFAULT_WORKERS = 2 if os.getenv("REDIS_URL") else 1
+workers = max(int(os.getenv("WEB_CONCURRENCY", DEFAULT_WORKERS)), 1)
+# Los workers heredan el entorno del master: así utils/mongodb conoce la cantidad de workers
+os.environ["WEB_CONCURRENCY"] = str(workers)
+
+worker_class = "uvicorn_worker.UvicornWorker"
+
+# Importar la app una sola vez en el master y compartir memoria entre workers (copy-on-write).
+# Es seguro porque importar main no abre conexiones: Mongo, HTTP y Firebase se inician en cada worker.
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() != "false"
+
+# Reciclar workers de forma escalonada para acotar fugas de memoria sin reiniciarlos todos a la vez
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "1000"))
+
+# Tiempo para terminar requests en curso (y cerrar pools en el lifespan) al reciclar o desplegar
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info")
@@ -1,14 +1,25 @@
-import uvicorn
+import os
 import logging
 
-from fastapi import FastAPI, Request
+from dotenv import load_dotenv
 
-from controllers.users import create_user, login
-from models.users import User
-from models.login import Login
+# Único punto donde se carga el .env; debe ir antes de importar los módulos que leen configuración
+load_dotenv()
 
-from utils.security import validateuser, validateadmin
+from contextlib import asynccontextmanager
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+
+from utils.mongodb import connect_mongo, close_mongo
+from utils.indexes import ensure_indexes, find_missing_indexes
+from utils.http_client import close_http_client
+from utils.firebase_tokens import start_key_rotation, stop_key_rotation
+from utils.cache import get_cache, close_cache
+from utils.order_state_machine import get_state_machine
+from utils.responses import ORJSONResponse
 
+from routes.health import router as health_router
+from routes.users import router as users_router
 from routes.catalogtypes import router as catalogtypes_router
 from routes.catalogs import router as catalogs_router
 from routes.bundle_details import router as bundle_details_router
@@ -16,82 +27,77 @@ from routes.order_statuses import router as order_statuses_router
 from routes.orders import router as orders_router
 from routes.order_details import router as order_details_router
 
-app = FastAPI()
-
-# Add CORS
-from fastapi.middleware.cors import CORSMiddleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # Allow all origins for development; restrict in production
-    allow_credentials=True,
-    allow_methods=["*"],  # Allow all methods
-    allow_headers=["*"],  # Allow all headers
-)
-
-# Incluir routers
-app.include_router(catalogtypes_router)
-app.include_router(catalogs_router)
-app.include_router(bundle_details_router)
-app.include_router(order_statuses_router)
-app.include_router(orders_router)
-app.include_router(order_details_router)
-
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-@app.get("/")
-def read_root():
-    return {"status": "healthy", "version": "0.0.0", "service": "dulceria-api"}
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Precalentar el pool de MongoDB antes de aceptar tráfico
+    try:
+        await connect_mongo()
+    except Exception as e:
+        logger.warning(f"MongoDB warm-up failed, connections will be opened on demand: {e}")
 
-@app.get("/health")
-def health_check():
+    # Crear índices faltantes del manifiesto (desactivable con MONGO_ENSURE_INDEXES=false: solo se verifican)
     try:
-        return {
-            "status": "healthy", 
-            "timestamp": "2025-08-02", 
-            "service": "dulceria-api",
-            "environment": "production"
-        }
+        if os.getenv("MONGO_ENSURE_INDEXES", "true").lower() != "false":
+            failed = await ensure_indexes()
+            if failed:
+                logger.warning(f"{len(failed)} index(es) could not be created, run 'python -m utils.indexes --check'")
+        else:
+            missing = await find_missing_indexes()
+            if missing:
+                logger.warning(f"{len(missing)} index(es) missing, run 'python -m utils.indexes'")
     except Exception as e:
-        return {"status": "unhealthy", "error": str(e)}
+        logger.warning(f"Index bootstrap skipped: {e}")
 
-@app.get("/ready")
-def readiness_check():
+    # Estados y transiciones de órdenes en memoria antes del primer checkout
     try:
-        from utils.mongodb import test_connection
-        db_status = test_connection()
-        return {
-            "status": "ready" if db_status else "not_ready",
-            "database": "connected" if db_status else "disconnected",
-            "service": "dulceria-api"
-        }
+        await get_state_machine()
     except Exception as e:
-        return {"status": "not_ready", "error": str(e)}
+        logger.warning(f"Order state machine not preloaded, it will load on first use: {e}")
+
+    # Llaves públicas de Google para /login/firebase, rotadas en segundo plano
+    start_key_rotation()
+
+    # Invalidaciones de caché publicadas por los demás workers (solo con REDIS_URL)
+    get_cache().start()
+    yield
+    await close_cache()
+    await stop_key_rotation()
+    await close_http_client()
+    await close_mongo()
+
+
+def create_app() -> FastAPI:
+    """Construir la aplicación. Importar este módulo no abre conexiones ni inicializa Firebase"""
+    app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
-@app.post("/users")
-async def create_user_endpoint(user: User) -> User:
-    return await create_user(user)
+    # Add CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],  # Allow all origins for development; restrict in production
+        allow_credentials=True,
+        allow_methods=["*"],  # Allow all methods
+        allow_headers=["*"],  # Allow all headers
+    )
 
-@app.post("/login")
-async def login_access(l: Login) -> dict:
-    return await login(l)
+    # Incluir routers
+    app.include_router(health_router)
+    app.include_router(users_router)
+    app.include_router(catalogtypes_router)
+    app.include_router(catalogs_router)
+    app.include_router(bundle_details_router)
+    app.include_router(order_statuses_router)
+    app.include_router(orders_router)
+    app.include_router(order_details_router)
 
+    return app
 
-@app.get("/exampleadmin")
-@validateadmin
-async def example_admin(request: Request):
-    return {
-        "message": "This is an example admin endpoint."
-        , "admin": request.state.admin
-    }
 
-@app.get("/exampleuser")
-@validateuser
-async def example_user(request: Request):
-    return {
-        "message": "This is an example user endpoint."
-        ,"email": request.state.email
-    }
+app = create_app()
 
+# Desarrollo local (un solo proceso); en producción: gunicorn main:app -c gunicorn.conf.py
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000, log_level="info")
\ No newline at end of file
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=8000, log_level="info")
@@ -23,4 +23,20 @@ class Login(BaseModel):
             raise ValueError("La contraseña debe contener al menos un número.")
         if not re.search(r"[@$!%*?&]", value):
             raise ValueError("La contraseña debe contener al menos un carácter especial (@$!%*?&).")
-        return value
\ No newline at end of file
+        return value
+
+
+class FirebaseLogin(BaseModel):
+
+    id_token: str = Field(
+        min_length=1,
+        description="ID token de Firebase obtenido en el cliente (signInWithPassword, proveedor social, etc.)"
+    )
+
+
+class RefreshTokenRequest(BaseModel):
+
+    refresh_token: str = Field(
+        min_length=1,
+        description="Refresh token recibido en /login, /login/firebase o /token/refresh"
+    )
\ No newline at end of file
@@ -65,6 +65,15 @@ class CreateOrderDetail(BaseModel):
     )
 
 
+class BulkCreateOrderDetails(BaseModel):
+    """Modelo para agregar varios productos a una orden en una sola llamada"""
+    items: list[CreateOrderDetail] = Field(
+        description="Productos a agregar; un producto repetido suma sus cantidades",
+        min_length=1,
+        max_length=200
+    )
+
+
 class UpdateOrderDetail(BaseModel):
     """Modelo para actualizar cantidad de un detalle"""
     quantity: int = Field(
@@ -15,3 +15,14 @@ class OrderStatus(BaseModel):
         pattern=r"^[a-zA-Z0-9\s\-_]+$",  # Solo letras, números, espacios, guiones y guiones bajos
         examples=["pending", "processing", "shipped", "delivered", "cancelled"]
     )
+
+    requires_products: Optional[bool] = Field(
+        default=None,
+        description="Si la orden debe tener productos para entrar a este estado (None: regla por defecto)"
+    )
+
+    next_statuses: Optional[list[str]] = Field(
+        default=None,
+        description="Estados a los que un admin puede mover la orden desde este (None: cualquiera)",
+        examples=[["shipped", "cancelled"]]
+    )
@@ -51,4 +51,17 @@ class User(BaseModel):
             raise ValueError("La contraseña debe contener al menos un número.")
         if not re.search(r"[@$!%*?&]", value):
             raise ValueError("La contraseña debe contener al menos un carácter especial (@$!%*?&).")
-        return value
\ No newline at end of file
+        return value
+
+
+class UpdateUserAccess(BaseModel):
+    """Cambiar el estado o los permisos de un usuario (revoca sus sesiones abiertas)"""
+    active: Optional[bool] = Field(
+        default=None,
+        description="Estado activo del usuario"
+    )
+
+    admin: Optional[bool] = Field(
+        default=None,
+        description="Permisos de administrador"
+    )
\ No newline at end of file
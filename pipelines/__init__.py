@@ -22,9 +22,9 @@ from .catalog_pipelines import (
 from .order_pipelines import (
     get_all_orders_pipeline,
     get_orders_by_user_pipeline,
+    get_orders_keyset_pipeline,
     get_order_by_id_pipeline,
-    get_order_owner_pipeline,
-    get_existing_inprogress_order_pipeline
+    get_order_owner_pipeline
 )
 
 from .order_detail_pipelines import (
@@ -51,9 +51,9 @@ __all__ = [
     # Order pipelines  
     "get_all_orders_pipeline",
     "get_orders_by_user_pipeline",
+    "get_orders_keyset_pipeline",
     "get_order_by_id_pipeline",
     "get_order_owner_pipeline",
-    "get_existing_inprogress_order_pipeline",
     
     # Order detail pipelines
     "get_order_details_pipeline",
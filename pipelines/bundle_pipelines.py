@@ -3,45 +3,28 @@ Pipelines de MongoDB para operaciones con bundles
 """
 from bson import ObjectId
 
-def get_bundle_validation_pipeline(bundle_id: str) -> list:
+def get_bundle_validation_pipeline(bundle_id: str, bundle_type_id: ObjectId) -> list:
     """
     Pipeline para validar que un bundle existe, está activo y es de tipo 'bundle'
+    (bundle_type_id viene de la caché de referencia, no requiere lookup a catalogtypes)
     """
     return [
-        {"$match": {"_id": ObjectId(bundle_id)}},
-        {"$addFields": {
-            "id_catalog_type_obj": {"$toObjectId": "$id_catalog_type"}
-        }},
-        {"$lookup": {
-            "from": "catalogtypes",
-            "localField": "id_catalog_type_obj",
-            "foreignField": "_id",
-            "as": "catalog_type"
-        }},
         {"$match": {
-            "catalog_type.description": {"$regex": "^bundle$", "$options": "i"},
+            "_id": ObjectId(bundle_id),
+            "id_catalog_type": bundle_type_id,
             "active": True
         }}
     ]
 
-def get_bundle_with_catalog_type_pipeline(bundle_id: str) -> list:
+def get_bundle_with_catalog_type_pipeline(bundle_id: str, bundle_type_id: ObjectId) -> list:
     """
-    Pipeline para obtener un bundle con información del catalog type
+    Pipeline para obtener un bundle verificando que sea de tipo 'bundle'
     (sin filtro de activo para casos de solo lectura)
     """
     return [
-        {"$match": {"_id": ObjectId(bundle_id)}},
-        {"$addFields": {
-            "id_catalog_type_obj": {"$toObjectId": "$id_catalog_type"}
-        }},
-        {"$lookup": {
-            "from": "catalogtypes",
-            "localField": "id_catalog_type_obj",
-            "foreignField": "_id",
-            "as": "catalog_type"
-        }},
         {"$match": {
-            "catalog_type.description": {"$regex": "^bundle$", "$options": "i"}
+            "_id": ObjectId(bundle_id),
+            "id_catalog_type": bundle_type_id
         }}
     ]
 
@@ -51,12 +34,9 @@ def get_bundle_products_pipeline(bundle_id: str) -> list:
     """
     return [
         {"$match": {"id_bundle": bundle_id}},
-        {"$addFields": {
-            "id_producto_obj": {"$toObjectId": "$id_producto"}
-        }},
         {"$lookup": {
             "from": "catalogs",
-            "localField": "id_producto_obj",
+            "localField": "id_producto",
             "foreignField": "_id",
             "as": "product_info"
         }},
@@ -73,26 +53,15 @@ def get_bundle_products_pipeline(bundle_id: str) -> list:
         }}
     ]
 
-def get_product_validation_pipeline(product_id: str) -> list:
+def get_product_validation_pipeline(product_id: str, product_type_id: ObjectId) -> list:
     """
-    Pipeline para validar que un producto existe y está activo
+    Pipeline para validar que un producto existe, está activo y es de tipo 'products'
     """
     return [
         {"$match": {
             "_id": ObjectId(product_id),
+            "id_catalog_type": product_type_id,
             "active": True
-        }},
-        {"$addFields": {
-            "id_catalog_type_obj": {"$toObjectId": "$id_catalog_type"}
-        }},
-        {"$lookup": {
-            "from": "catalogtypes",
-            "localField": "id_catalog_type_obj",
-            "foreignField": "_id",
-            "as": "catalog_type"
-        }},
-        {"$match": {
-            "catalog_type.description": {"$regex": "^products$", "$options": "i"}
         }}
     ]
 
@@ -105,12 +74,9 @@ def get_bundle_detail_with_product_pipeline(bundle_id: str, bundle_detail_id: st
             "_id": ObjectId(bundle_detail_id),
             "id_bundle": bundle_id
         }},
-        {"$addFields": {
-            "id_producto_obj": {"$toObjectId": "$id_producto"}
-        }},
         {"$lookup": {
             "from": "catalogs",
-            "localField": "id_producto_obj",
+            "localField": "id_producto",
             "foreignField": "_id",
             "as": "product_info"
         }},
@@ -132,7 +98,7 @@ def check_existing_product_in_bundle_pipeline(bundle_id: str, product_id: str) -
     return [
         {"$match": {
             "id_bundle": bundle_id,
-            "id_producto": product_id
+            "id_producto": ObjectId(product_id)
         }},
         {"$project": {
             "bundle_detail_id": {"$toString": "$_id"},
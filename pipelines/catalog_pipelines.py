@@ -9,12 +9,9 @@ def get_catalog_with_type_pipeline(catalog_id: str) -> list:
     """
     return [
         {"$match": {"_id": ObjectId(catalog_id)}},
-        {"$addFields": {
-            "id_catalog_type_obj": {"$toObjectId": "$id_catalog_type"}
-        }},
         {"$lookup": {
             "from": "catalogtypes",
-            "localField": "id_catalog_type_obj",
+            "localField": "id_catalog_type",
             "foreignField": "_id",
             "as": "catalog_type"
         }},
@@ -36,12 +33,9 @@ def get_catalogs_by_type_pipeline(catalog_type_description: str, skip: int = 0,
     Pipeline para obtener catálogos filtrados por tipo con paginación
     """
     return [
-        {"$addFields": {
-            "id_catalog_type_obj": {"$toObjectId": "$id_catalog_type"}
-        }},
         {"$lookup": {
             "from": "catalogtypes",
-            "localField": "id_catalog_type_obj",
+            "localField": "id_catalog_type",
             "foreignField": "_id",
             "as": "catalog_type"
         }},
@@ -66,14 +60,12 @@ def get_catalogs_by_type_pipeline(catalog_type_description: str, skip: int = 0,
 def get_all_catalogs_with_types_pipeline(skip: int = 0, limit: int = 10) -> list:
     """
     Pipeline para obtener todos los catálogos con información del tipo
+    (limit=None para recorrerlos todos, p. ej. en el modo streaming)
     """
-    return [
-        {"$addFields": {
-            "id_catalog_type_obj": {"$toObjectId": "$id_catalog_type"}
-        }},
+    pipeline = [
         {"$lookup": {
             "from": "catalogtypes",
-            "localField": "id_catalog_type_obj",
+            "localField": "id_catalog_type",
             "foreignField": "_id",
             "as": "catalog_type"
         }},
@@ -92,9 +84,11 @@ def get_all_catalogs_with_types_pipeline(skip: int = 0, limit: int = 10) -> list
             "active": "$active",
             "catalog_type_description": "$catalog_type.description"
         }},
-        {"$skip": skip},
-        {"$limit": limit}
+        {"$skip": skip}
     ]
+    if limit is not None:
+        pipeline.append({"$limit": limit})
+    return pipeline
 
 def validate_catalog_type_pipeline(catalog_type_id: str) -> list:
     """
@@ -124,12 +118,9 @@ def search_catalogs_pipeline(search_term: str, skip: int = 0, limit: int = 10) -
             ],
             "active": True
         }},
-        {"$addFields": {
-            "id_catalog_type_obj": {"$toObjectId": "$id_catalog_type"}
-        }},
         {"$lookup": {
             "from": "catalogtypes",
-            "localField": "id_catalog_type_obj",
+            "localField": "id_catalog_type",
             "foreignField": "_id",
             "as": "catalog_type"
         }},
@@ -9,7 +9,7 @@ def get_catalog_type_pipeline() -> list:
         },{
             "$lookup": {
                 "from": "catalogs",
-                "localField": "id",
+                "localField": "_id",
                 "foreignField": "id_catalog_type",
                 "as": "result"
             }
@@ -49,7 +49,7 @@ def validate_type_is_assigned_pipeline(id: str) -> list:
         },{
             "$lookup": {
                 "from": "catalogs",
-                "localField": "id",
+                "localField": "_id",
                 "foreignField": "id_catalog_type",
                 "as": "result"
             }
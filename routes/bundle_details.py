@@ -6,13 +6,16 @@ from controllers.bundle_details import (
     remove_product_from_bundle
 )
 from utils.security import validateadmin
+from utils.response_cache import cached_json_response
 
 router = APIRouter()
 
 @router.get("/bundle/{bundle_id}", response_model=BundleWithProducts, tags=["🎁 Bundle Details"])
-async def get_bundle_with_products_endpoint(bundle_id: str) -> BundleWithProducts:
+async def get_bundle_with_products_endpoint(request: Request, bundle_id: str) -> BundleWithProducts:
     """Obtener información completa del bundle con todos sus productos"""
-    return await get_bundle_with_products(bundle_id)
+    return await cached_json_response(
+        request, "bundles", bundle_id, lambda: get_bundle_with_products(bundle_id), model=BundleWithProducts
+    )
 
 @router.post("/bundles/{bundle_id}/product", tags=["🎁 Bundle Details"])
 @validateadmin
@@ -1,13 +1,16 @@
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, HTTPException, Request, Query
 from models.catalogs import Catalog
 from controllers.catalogs import (
     create_catalog,
     get_catalogs,
+    open_catalogs_cursor,
     get_catalog_by_id,
     update_catalog,
     deactivate_catalog
 )
 from utils.security import validateuser
+from utils.response_cache import cached_json_response
+from utils.streaming import stream_response
 
 router = APIRouter()
 
@@ -18,14 +21,23 @@ async def create_catalog_endpoint(request: Request, catalog: Catalog) -> Catalog
     return await create_catalog(catalog)
 
 @router.get("/catalogs", response_model=dict, tags=["📋 Catalogs"])
-async def get_catalogs_endpoint() -> dict:
+async def get_catalogs_endpoint(request: Request) -> dict:
     """Obtener todos los catálogos"""
-    return await get_catalogs()
+    return await cached_json_response(request, "catalogs", "all", get_catalogs)
+
+@router.get("/catalogs/stream", tags=["📋 Catalogs"])
+async def stream_catalogs_endpoint(
+    format: str = Query(default="ndjson", pattern="^(ndjson|json)$", description="ndjson (una fila por línea) o json (arreglo)")
+):
+    """Todos los catálogos en streaming, sin límite de 1000 filas"""
+    return stream_response(await open_catalogs_cursor(), format)
 
 @router.get("/catalogs/{catalog_id}", response_model=Catalog, tags=["📋 Catalogs"])
-async def get_catalog_by_id_endpoint(catalog_id: str) -> Catalog:
+async def get_catalog_by_id_endpoint(request: Request, catalog_id: str) -> Catalog:
     """Obtener un catálogo por ID"""
-    return await get_catalog_by_id(catalog_id)
+    return await cached_json_response(
+        request, "catalogs", catalog_id, lambda: get_catalog_by_id(catalog_id), model=Catalog
+    )
 
 @router.put("/catalogs/{catalog_id}", response_model=Catalog, tags=["📋 Catalogs"])
 @validateuser
@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Request
+from utils.mongodb import async_t_connection
+from utils.security import validateadmin
+from utils.single_flight import flight_stats
+
+router = APIRouter()
+
+@router.get("/")
+def read_root():
+    return {"status": "healthy", "version": "0.0.0", "service": "dulceria-api"}
+
+@router.get("/health")
+def health_check():
+    try:
+        return {
+            "status": "healthy", 
+            "timestamp": "2025-08-02", 
+            "service": "dulceria-api",
+            "environment": "production"
+        }
+    except Exception as e:
+        return {"status": "unhealthy", "error": str(e)}
+
+@router.get("/ready")
+async def readiness_check():
+    try:
+        db_status = await async_t_connection()
+        return {
+            "status": "ready" if db_status else "not_ready",
+            "database": "connected" if db_status else "disconnected",
+            "service": "dulceria-api"
+        }
+    except Exception as e:
+        return {"status": "not_ready", "error": str(e)}
+
+@router.get("/metrics/single-flight")
+@validateadmin
+async def single_flight_metrics(request: Request):
+    """Requests coalescidos por namespace desde que arrancó este worker"""
+    return flight_stats()
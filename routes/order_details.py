@@ -1,12 +1,14 @@
 from fastapi import APIRouter, Query, HTTPException, Request
-from models.order_details import CreateOrderDetail, UpdateOrderDetail
+from models.order_details import CreateOrderDetail, BulkCreateOrderDetails, UpdateOrderDetail
 from controllers.order_details import (
     create_order_detail,
+    create_order_details_bulk,
     get_order_details,
     update_order_detail,
-    delete_order_detail
+    delete_order_detail,
+    repair_order_totals
 )
-from utils.security import validateuser
+from utils.security import validateuser, validateadmin
 
 router = APIRouter(prefix="/orders")
 
@@ -16,13 +18,14 @@ router = APIRouter(prefix="/orders")
 async def add_product_to_order(
     request: Request,
     order_id: str,
-    detail_data: CreateOrderDetail
+    detail_data: CreateOrderDetail,
+    increment: bool = Query(False, description="Si el producto ya está en la orden, sumar la cantidad en lugar de responder 409")
 ):
     """Agregar producto a una orden - Solo el dueño de la orden"""
     is_admin = getattr(request.state, 'admin', False)
     requesting_user_id = request.state.id if not is_admin else None
     
-    result = await create_order_detail(order_id, detail_data, requesting_user_id, is_admin)
+    result = await create_order_detail(order_id, detail_data, requesting_user_id, is_admin, increment)
     
     if not result["success"]:
         if result["message"] == "Orden no encontrada":
@@ -37,6 +40,30 @@ async def add_product_to_order(
     return result
 
 
+@router.post("/{order_id}/details", tags=["🛒 Order Details"])
+@validateuser
+async def add_products_to_order(
+    request: Request,
+    order_id: str,
+    bulk_data: BulkCreateOrderDetails
+):
+    """Agregar varios productos a una orden en una sola llamada (p. ej. restaurar un carrito) - Solo el dueño de la orden"""
+    is_admin = getattr(request.state, 'admin', False)
+    requesting_user_id = request.state.id if not is_admin else None
+    
+    result = await create_order_details_bulk(order_id, bulk_data, requesting_user_id, is_admin)
+    
+    if not result["success"]:
+        if result["message"] == "Orden no encontrada":
+            raise HTTPException(status_code=404, detail=result["message"])
+        elif "permiso" in result["message"]:
+            raise HTTPException(status_code=403, detail=result["message"])
+        else:
+            raise HTTPException(status_code=400, detail=result["message"])
+    
+    return result
+
+
 @router.get("/{order_id}/details", tags=["� Order Details"])
 @validateuser
 async def get_order_products(
@@ -107,3 +134,21 @@ async def remove_product_from_order(
             raise HTTPException(status_code=400, detail=result["message"])
     
     return result
+
+
+@router.post("/{order_id}/recalculate", tags=["🛒 Order Details"])
+@validateadmin
+async def recalculate_order(
+    request: Request,
+    order_id: str
+):
+    """Recalcular los totales de una orden desde sus detalles activos - Solo admins"""
+    result = await repair_order_totals(order_id)
+    
+    if not result["success"]:
+        if result["message"] == "Orden no encontrada":
+            raise HTTPException(status_code=404, detail=result["message"])
+        else:
+            raise HTTPException(status_code=400, detail=result["message"])
+    
+    return result
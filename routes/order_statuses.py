@@ -8,6 +8,7 @@ from controllers.order_statuses import (
     delete_order_status
 )
 from utils.security import validateadmin
+from utils.response_cache import cached_json_response
 
 router = APIRouter()
 
@@ -21,9 +22,9 @@ async def create_order_status_endpoint(
     return await create_order_status(order_status)
 
 @router.get("/order-statuses", tags=["📊 Order Status"])
-async def get_order_statuses_endpoint() -> dict:
+async def get_order_statuses_endpoint(request: Request) -> dict:
     """Obtener todos los order statuses"""
-    return await get_order_statuses()
+    return await cached_json_response(request, "order_statuses", "all", get_order_statuses)
 
 @router.get("/order-statuses/{order_status_id}", tags=["📊 Order Status"])
 async def get_order_status_by_id_endpoint(order_status_id: str) -> dict:
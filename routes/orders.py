@@ -1,13 +1,18 @@
+from typing import Optional
 from fastapi import APIRouter, Query, HTTPException, Request
 from models.orders import CreateOrder
 from models.change_order_status import ChangeOrderStatus
 from controllers.orders import (
     create_order,
     get_orders,
+    open_orders_cursor,
     get_order_by_id,
     update_order_status
 )
+from controllers.checkout import checkout_order
 from utils.security import validateuser, validateadmin
+from utils.responses import ORJSONResponse
+from utils.streaming import stream_response
 
 router = APIRouter(prefix="/orders")
 
@@ -33,23 +38,57 @@ async def create_new_order(
 async def get_all_orders(
     request: Request,
     skip: int = Query(default=0, ge=0, description="Número de registros a omitir"),
-    limit: int = Query(default=50, ge=1, le=100, description="Número de registros a obtener")
+    limit: int = Query(default=50, ge=1, le=100, description="Número de registros a obtener"),
+    pagination: str = Query(default="offset", pattern="^(offset|cursor)$", description="Modo de paginación: offset (skip/limit) o cursor"),
+    cursor: Optional[str] = Query(default=None, description="Cursor opaco (next_cursor) de la página anterior"),
+    include_total: bool = Query(default=True, description="Incluir el total de órdenes en la respuesta")
 ):
     """
     Obtener órdenes:
     - Admin: todas las órdenes del sistema
     - Usuario: solo sus propias órdenes
+    - pagination=cursor: páginas de costo constante, usar next_cursor para la siguiente
     """
     # Verificar si es admin desde request.state
     is_admin = getattr(request.state, 'admin', False)
     user_id = None if is_admin else request.state.id
     
-    result = await get_orders(skip=skip, limit=limit, user_id=user_id)
+    result = await get_orders(
+        skip=skip,
+        limit=limit,
+        user_id=user_id,
+        cursor=cursor,
+        use_cursor=pagination == "cursor",
+        include_total=include_total
+    )
     
     if not result["success"]:
         raise HTTPException(status_code=400, detail=result["message"])
     
-    return result
+    # Filas ya proyectadas por la pipeline: se serializan directo con orjson
+    return ORJSONResponse(result)
+
+
+@router.get("/export", tags=["📦 Orders"])
+@validateuser
+async def export_orders(
+    request: Request,
+    format: str = Query(default="ndjson", pattern="^(ndjson|json)$", description="ndjson (una fila por línea) o json (arreglo)")
+):
+    """
+    Exportar órdenes en streaming (más recientes primero):
+    - Admin: todas las órdenes del sistema
+    - Usuario: solo sus propias órdenes
+    """
+    is_admin = getattr(request.state, 'admin', False)
+    user_id = None if is_admin else request.state.id
+
+    result = await open_orders_cursor(user_id)
+
+    if not result["success"]:
+        raise HTTPException(status_code=400, detail=result["message"])
+
+    return stream_response(result["data"], format)
 
 
 @router.get("/{order_id}", tags=["📦 Orders"])
@@ -91,18 +130,15 @@ async def finalize_order(
     - Solo sus propias órdenes
     - No requiere payload
     """
-    result = await update_order_status(
-        order_id, 
-        None,  # No enviamos id_status, se determina automáticamente
-        requesting_user_id=request.state.id,
-        is_admin=False
-    )
+    result = await checkout_order(order_id, request.state.id)
     
     if not result["success"]:
         if result["message"] == "Orden no encontrada":
             raise HTTPException(status_code=404, detail=result["message"])
         elif "permiso" in result["message"]:
             raise HTTPException(status_code=403, detail=result["message"])
+        elif "intenta de nuevo" in result["message"]:
+            raise HTTPException(status_code=409, detail=result["message"])
         else:
             raise HTTPException(status_code=400, detail=result["message"])
     
@@ -130,6 +166,8 @@ async def change_order_status_admin(
     if not result["success"]:
         if result["message"] == "Orden no encontrada":
             raise HTTPException(status_code=404, detail=result["message"])
+        elif "intenta de nuevo" in result["message"]:
+            raise HTTPException(status_code=409, detail=result["message"])
         else:
             raise HTTPException(status_code=400, detail=result["message"])
     
@@ -0,0 +1,57 @@
+from fastapi import APIRouter, Request
+from models.users import User, UpdateUserAccess
+from models.login import Login, FirebaseLogin, RefreshTokenRequest
+from controllers.users import (
+    create_user,
+    login,
+    login_firebase,
+    refresh_session,
+    revoke_session,
+    update_user_access
+)
+from utils.security import validateuser, validateadmin
+
+router = APIRouter()
+
+@router.post("/users")
+async def create_user_endpoint(user: User) -> User:
+    return await create_user(user)
+
+@router.post("/login")
+async def login_access(l: Login) -> dict:
+    return await login(l)
+
+@router.post("/login/firebase")
+async def login_firebase_access(l: FirebaseLogin) -> dict:
+    return await login_firebase(l)
+
+@router.post("/token/refresh")
+async def token_refresh(r: RefreshTokenRequest) -> dict:
+    return await refresh_session(r)
+
+@router.post("/token/revoke")
+async def token_revoke(r: RefreshTokenRequest) -> dict:
+    return await revoke_session(r)
+
+
+@router.put("/users/{user_id}/access")
+@validateadmin
+async def update_user_access_endpoint(request: Request, user_id: str, data: UpdateUserAccess) -> dict:
+    return await update_user_access(user_id, data)
+
+
+@router.get("/exampleadmin")
+@validateadmin
+async def example_admin(request: Request):
+    return {
+        "message": "This is an example admin endpoint."
+        , "admin": request.state.admin
+    }
+
+@router.get("/exampleuser")
+@validateuser
+async def example_user(request: Request):
+    return {
+        "message": "This is an example user endpoint."
+        ,"email": request.state.email
+    }
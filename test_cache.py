@@ -0,0 +1,56 @@
+import asyncio
+import pytest
+
+from utils.cache import SharedCache, MemoryBackend, RedisBackend, on_invalidate
+
+
+def test_memory_backend_versioned_keys():
+    async def scenario():
+        cache = SharedCache(MemoryBackend(max_entries=10))
+        key = await cache.key("catalogs", "all")
+        await cache.set(key, b"v1", ttl=60)
+        assert await cache.get(await cache.key("catalogs", "all")) == b"v1"
+
+        await cache.invalidate("catalogs")
+        assert await cache.get(await cache.key("catalogs", "all")) is None
+
+    asyncio.run(scenario())
+
+
+def test_memory_backend_lru_eviction():
+    async def scenario():
+        cache = SharedCache(MemoryBackend(max_entries=2))
+        for item in ("a", "b", "c"):
+            await cache.set(await cache.key("bundles", item), item.encode(), ttl=60)
+        assert await cache.get(await cache.key("bundles", "a")) is None
+        assert await cache.get(await cache.key("bundles", "c")) == b"c"
+
+    asyncio.run(scenario())
+
+
+def test_redis_invalidation_reaches_other_workers():
+    fakeredis = pytest.importorskip("fakeredis")
+
+    async def scenario():
+        server = fakeredis.FakeServer()
+        # Dos workers con su propio cliente contra el mismo servidor
+        worker_a = SharedCache(RedisBackend(client=fakeredis.FakeAsyncRedis(server=server)))
+        worker_b = SharedCache(RedisBackend(client=fakeredis.FakeAsyncRedis(server=server)))
+
+        invalidated = []
+        on_invalidate("test_namespace", lambda: invalidated.append(True))
+
+        await worker_b.set(await worker_b.key("test_namespace", "1"), b"old", ttl=60)
+        worker_b.start()
+        await asyncio.sleep(0.1)
+
+        await worker_a.invalidate("test_namespace")
+        await asyncio.sleep(0.1)
+
+        assert invalidated
+        assert await worker_b.get(await worker_b.key("test_namespace", "1")) is None
+
+        await worker_a.stop()
+        await worker_b.stop()
+
+    asyncio.run(scenario())
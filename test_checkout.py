@@ -0,0 +1,100 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+from bson import ObjectId
+
+import controllers.checkout as checkout
+from utils.order_state_machine import OrderStateMachine
+
+ORDER_ID = ObjectId()
+USER_ID = ObjectId()
+STATUSES = [{"_id": ObjectId(), "description": description} for description in ["inprogress", "ordered", "shipped"]]
+
+
+class FakeCollection:
+    def __init__(self, document=None, modified_count=1):
+        self.document = document
+        self.modified_count = modified_count
+        self.updates = []
+        self.inserts = []
+
+    async def find_one(self, *args, **kwargs):
+        return self.document
+
+    async def count_documents(self, *args, **kwargs):
+        return 0
+
+    async def update_one(self, filter, update, session=None):
+        self.updates.append(filter)
+        return SimpleNamespace(modified_count=self.modified_count)
+
+    async def insert_one(self, document, session=None):
+        self.inserts.append(document)
+        return SimpleNamespace(inserted_id=ObjectId())
+
+
+@pytest.fixture
+def collections(monkeypatch):
+    collections = {"orders": FakeCollection(), "order_status_record": FakeCollection()}
+
+    async def fake_get_state_machine():
+        return OrderStateMachine(STATUSES, 1)
+
+    async def fake_run_in_transaction(callback):
+        return await callback(None)
+
+    monkeypatch.setattr(checkout, "get_async_collection", lambda name: collections[name])
+    monkeypatch.setattr(checkout, "get_state_machine", fake_get_state_machine)
+    monkeypatch.setattr(checkout, "run_in_transaction", fake_run_in_transaction)
+    return collections
+
+
+def _order(**fields):
+    return {"_id": ORDER_ID, "id_user": USER_ID, **fields}
+
+
+def test_checkout_transition_is_conditional_on_read_status(collections):
+    collections["orders"].document = _order(current_status={"description": "inprogress"}, item_count=2)
+
+    result = asyncio.run(checkout.checkout_order(str(ORDER_ID), str(USER_ID)))
+
+    assert result["success"] is True
+    assert collections["orders"].updates == [{
+        "_id": ORDER_ID,
+        "current_status.description": "inprogress",
+        "item_count": {"$gt": 0}
+    }]
+    assert len(collections["order_status_record"].inserts) == 1
+
+
+def test_checkout_conflict_when_order_changed(collections):
+    collections["orders"].document = _order(current_status={"description": "inprogress"}, item_count=2)
+    collections["orders"].modified_count = 0
+
+    result = asyncio.run(checkout.checkout_order(str(ORDER_ID), str(USER_ID)))
+
+    assert result["success"] is False
+    assert "intenta de nuevo" in result["message"]
+    assert collections["order_status_record"].inserts == []
+
+
+def test_checkout_rejects_empty_order(collections):
+    collections["orders"].document = _order(current_status={"description": "inprogress"}, item_count=0)
+
+    result = asyncio.run(checkout.checkout_order(str(ORDER_ID), str(USER_ID)))
+
+    assert result["success"] is False
+    assert "vacía" in result["message"]
+    assert collections["orders"].updates == []
+
+
+def test_checkout_legacy_order_uses_latest_status_record(collections):
+    # Orden sin current_status cuyo último registro del historial es 'ordered'
+    collections["orders"].document = _order(item_count=2)
+    collections["order_status_record"].document = {"id_status": STATUSES[1]["_id"]}
+
+    result = asyncio.run(checkout.checkout_order(str(ORDER_ID), str(USER_ID)))
+
+    assert result["success"] is False
+    assert result["message"] == "Solo puedes finalizar órdenes en progreso"
+    assert collections["orders"].updates == []
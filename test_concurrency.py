@@ -0,0 +1,39 @@
+import asyncio
+import time
+import pytest
+
+from utils.concurrency import fan_out
+
+
+def test_fan_out_runs_concurrently_and_keeps_order():
+    async def delayed(value, delay):
+        await asyncio.sleep(delay)
+        return value
+
+    async def scenario():
+        start = time.perf_counter()
+        results = await fan_out(delayed("a", 0.2), delayed("b", 0.1), delayed("c", 0.2))
+        return results, time.perf_counter() - start
+
+    results, elapsed = asyncio.run(scenario())
+    assert results == ["a", "b", "c"]
+    assert elapsed < 0.4
+
+
+def test_fan_out_cancels_siblings_and_reraises_first_error():
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError, match="boom"):
+        asyncio.run(fan_out(slow(), failing()))
+    assert cancelled == [True]
@@ -0,0 +1,59 @@
+import time
+import asyncio
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from utils import firebase_tokens
+
+PROJECT_ID = "dulceria-test"
+
+# Llaves generadas localmente en lugar de los certificados de Google
+signing_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+other_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+def make_token(key=signing_key, kid="test-kid", **overrides):
+    now = int(time.time())
+    claims = {
+        "iss": f"https://securetoken.google.com/{PROJECT_ID}"
+        , "aud": PROJECT_ID
+        , "sub": "firebase-uid"
+        , "email": "cliente@dulceria.com"
+        , "iat": now
+        , "auth_time": now
+        , "exp": now + 3600
+    }
+    claims.update(overrides)
+    return jwt.encode(claims, key, algorithm="RS256", headers={"kid": kid})
+
+
+@pytest.fixture(autouse=True)
+def local_keys(monkeypatch):
+    monkeypatch.setenv("FIREBASE_PROJECT_ID", PROJECT_ID)
+    firebase_tokens.set_signing_keys({"test-kid": signing_key.public_key()})
+
+
+def test_valid_token():
+    claims = asyncio.run(firebase_tokens.verify_firebase_id_token(make_token()))
+    assert claims["email"] == "cliente@dulceria.com"
+
+
+def test_wrong_signature():
+    with pytest.raises(jwt.InvalidSignatureError):
+        asyncio.run(firebase_tokens.verify_firebase_id_token(make_token(key=other_key)))
+
+
+def test_wrong_audience():
+    with pytest.raises(jwt.InvalidAudienceError):
+        asyncio.run(firebase_tokens.verify_firebase_id_token(make_token(aud="otro-proyecto")))
+
+
+def test_expired_token():
+    with pytest.raises(jwt.ExpiredSignatureError):
+        asyncio.run(firebase_tokens.verify_firebase_id_token(make_token(exp=int(time.time()) - 3600)))
+
+
+def test_unknown_kid():
+    with pytest.raises(jwt.InvalidSignatureError):
+        asyncio.run(firebase_tokens.verify_firebase_id_token(make_token(kid="rotated-kid")))
@@ -0,0 +1,146 @@
+import asyncio
+import pytest
+from bson import ObjectId
+
+import controllers.order_details as order_details
+from models.order_details import CreateOrderDetail, BulkCreateOrderDetails
+
+ORDER_ID = ObjectId()
+USER_ID = ObjectId()
+PRODUCT_ID = ObjectId()
+OTHER_PRODUCT_ID = ObjectId()
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    async def to_list(self):
+        return self.documents
+
+
+class FakeCollection:
+    def __init__(self, document=None, documents=None):
+        self.document = document
+        self.documents = documents or []
+
+    async def find_one(self, *args, **kwargs):
+        return self.document
+
+    def find(self, *args, **kwargs):
+        return FakeCursor(self.documents)
+
+
+@pytest.fixture
+def totals(monkeypatch):
+    """Captura las llamadas a la escritura de totales (incremental y recálculo)"""
+    calls = []
+
+    async def fake_apply(order_id, subtotal_delta, item_count_delta=0):
+        calls.append(("delta", subtotal_delta, item_count_delta))
+        return {"success": False}
+
+    async def fake_recalculate(order_id):
+        calls.append(("recalculate",))
+        return {"success": False}
+
+    monkeypatch.setattr(order_details, "apply_order_totals_delta", fake_apply)
+    monkeypatch.setattr(order_details, "recalculate_order_totals", fake_recalculate)
+    return calls
+
+
+@pytest.fixture
+def collections(monkeypatch):
+    collections = {
+        "orders": FakeCollection({"_id": ORDER_ID, "id_user": USER_ID}),
+        "catalogs": FakeCollection({"_id": PRODUCT_ID, "cost": 2.5}),
+        "order_details": FakeCollection()
+    }
+    monkeypatch.setattr(order_details, "get_async_collection", lambda name: collections[name])
+    return collections
+
+
+def test_order_totals_update_sets_item_count_only_when_given():
+    without_count = order_details.order_totals_update(10.0, 0.16)
+    with_count = order_details.order_totals_update(10.0, 0.16, item_count=3)
+
+    assert "item_count" not in without_count[0]["$set"]
+    assert with_count[0]["$set"]["item_count"] == 3
+    assert with_count[0]["$set"]["subtotal"] == {"$round": [10.0, 2]}
+    assert with_count[1]["$set"]["taxes"] == {"$round": [{"$multiply": ["$subtotal", 0.16]}, 2]}
+
+
+def test_apply_delta_changes_item_count_only_with_a_line_delta(monkeypatch):
+    writes = []
+
+    async def fake_write(order_id, subtotal, item_count=None):
+        writes.append((subtotal, item_count))
+        return {"success": True}
+
+    monkeypatch.setattr(order_details, "write_order_totals", fake_write)
+    asyncio.run(order_details.apply_order_totals_delta(str(ORDER_ID), 5.0))
+    asyncio.run(order_details.apply_order_totals_delta(str(ORDER_ID), -5.0, -1))
+
+    assert writes[0] == ({"$max": [{"$add": [{"$ifNull": ["$subtotal", 0.0]}, 5.0]}, 0.0]}, None)
+    assert writes[1][1] == order_details.item_count_delta_expression(-1)
+
+
+def test_apply_delta_recalculates_when_write_fails(monkeypatch):
+    async def failing_write(*args, **kwargs):
+        raise RuntimeError("write failed")
+
+    async def fake_recalculate(order_id):
+        return {"success": True, "recalculated": order_id}
+
+    monkeypatch.setattr(order_details, "write_order_totals", failing_write)
+    monkeypatch.setattr(order_details, "recalculate_order_totals", fake_recalculate)
+
+    result = asyncio.run(order_details.apply_order_totals_delta(str(ORDER_ID), 5.0, 1))
+    assert result == {"success": True, "recalculated": str(ORDER_ID)}
+
+
+@pytest.mark.parametrize("line_quantity, new_lines", [(2, 1), (5, 0)])
+def test_increment_counts_new_line_only_when_created(collections, totals, monkeypatch, line_quantity, new_lines):
+    async def fake_upsert(order_id, product_id, quantity, unit_price):
+        return {"_id": ObjectId(), "quantity": line_quantity, "unit_price": 2.0}
+
+    monkeypatch.setattr(order_details, "upsert_order_detail_line", fake_upsert)
+    detail = CreateOrderDetail(id_producto=str(PRODUCT_ID), quantity=2)
+
+    result = asyncio.run(order_details.create_order_detail(str(ORDER_ID), detail, str(USER_ID), increment=True))
+
+    assert result["success"] is True
+    assert totals == [("delta", 4.0, new_lines)]
+
+
+def _bulk_setup(collections, monkeypatch, upserted, clean=True):
+    collections["catalogs"].documents = [{"_id": PRODUCT_ID, "cost": 2.5}, {"_id": OTHER_PRODUCT_ID, "cost": 1.0}]
+    # PRODUCT_ID ya tiene línea activa: solo OTHER_PRODUCT_ID (índice 1) debería insertarse
+    collections["order_details"].documents = [{"id_producto": PRODUCT_ID, "unit_price": 2.0}]
+
+    async def fake_bulk(operations):
+        return {"upserted": upserted, "matched": len(operations) - len(upserted), "failed": set(), "clean": clean}
+
+    monkeypatch.setattr(order_details, "bulk_upsert_order_detail_lines", fake_bulk)
+    return BulkCreateOrderDetails(items=[
+        {"id_producto": str(PRODUCT_ID), "quantity": 1},
+        {"id_producto": str(OTHER_PRODUCT_ID), "quantity": 3}
+    ])
+
+
+def test_bulk_applies_delta_when_inserts_match_the_read(collections, totals, monkeypatch):
+    bulk = _bulk_setup(collections, monkeypatch, upserted={1})
+
+    result = asyncio.run(order_details.create_order_details_bulk(str(ORDER_ID), bulk, str(USER_ID)))
+
+    assert result["data"]["inserted"] == 1
+    assert totals == [("delta", 2.0 * 1 + 1.0 * 3, 1)]
+
+
+@pytest.mark.parametrize("upserted, clean", [({0, 1}, True), (set(), True), ({1}, False)])
+def test_bulk_recalculates_when_lines_changed_concurrently(collections, totals, monkeypatch, upserted, clean):
+    bulk = _bulk_setup(collections, monkeypatch, upserted=upserted, clean=clean)
+
+    asyncio.run(order_details.create_order_details_bulk(str(ORDER_ID), bulk, str(USER_ID)))
+
+    assert totals == [("recalculate",)]
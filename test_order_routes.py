@@ -0,0 +1,70 @@
+import os
+import pytest
+from fastapi.testclient import TestClient
+
+os.environ.setdefault("SECRET_KEY", "test-secret-key-with-at-least-32-bytes")
+
+import routes.orders as orders_routes
+from main import create_app
+from utils.security import create_jwt_token
+
+
+def _token(admin: bool) -> str:
+    return create_jwt_token(
+        firstname="Ana", lastname="Pérez", email="ana@example.com",
+        active=True, admin=admin, id="507f1f77bcf86cd799439011"
+    )
+
+
+@pytest.fixture
+def client():
+    # Sin el context manager de TestClient no corre el lifespan (no hace falta MongoDB)
+    return TestClient(create_app())
+
+
+@pytest.fixture
+def captured(monkeypatch):
+    calls = []
+
+    async def fake_get_orders(**kwargs):
+        calls.append(kwargs["user_id"])
+        return {"success": True, "message": "ok", "data": []}
+
+    monkeypatch.setattr(orders_routes, "get_orders", fake_get_orders)
+    return calls
+
+
+def test_admin_token_lists_all_orders(client, captured):
+    response = client.get("/orders/", headers={"Authorization": f"Bearer {_token(admin=True)}"})
+    assert response.status_code == 200
+    assert captured == [None]
+
+
+def test_user_token_lists_own_orders(client, captured):
+    response = client.get("/orders/", headers={"Authorization": f"Bearer {_token(admin=False)}"})
+    assert response.status_code == 200
+    assert captured == ["507f1f77bcf86cd799439011"]
+
+
+def test_admin_token_exports_all_orders(client, monkeypatch):
+    calls = []
+
+    class EmptyCursor:
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            raise StopAsyncIteration
+
+        async def close(self):
+            pass
+
+    async def fake_open_orders_cursor(user_id):
+        calls.append(user_id)
+        return {"success": True, "message": "ok", "data": EmptyCursor()}
+
+    monkeypatch.setattr(orders_routes, "open_orders_cursor", fake_open_orders_cursor)
+    response = client.get("/orders/export?format=json", headers={"Authorization": f"Bearer {_token(admin=True)}"})
+    assert response.status_code == 200
+    assert response.json() == []
+    assert calls == [None]
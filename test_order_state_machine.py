@@ -0,0 +1,34 @@
+from bson import ObjectId
+
+from utils.order_state_machine import OrderStateMachine, NOT_ALLOWED, EMPTY_ORDER, UNKNOWN_STATUS
+
+
+def _statuses(**extra):
+    statuses = [
+        {"_id": ObjectId(), "description": description}
+        for description in ["inprogress", "ordered", "shipped", "cancelled"]
+    ]
+    for status in statuses:
+        status.update(extra.get(status["description"], {}))
+    return statuses
+
+
+def test_user_can_only_finalize_in_progress_orders():
+    machine = OrderStateMachine(_statuses())
+    assert machine.check("user", "inprogress", "ordered", item_count=2) is None
+    assert machine.check("user", "ordered", "ordered", item_count=2) == NOT_ALLOWED
+    assert machine.check("user", "inprogress", "shipped", item_count=2) == NOT_ALLOWED
+    assert machine.check("user", "inprogress", "ordered", item_count=0) == EMPTY_ORDER
+
+
+def test_admin_rules_from_status_documents():
+    machine = OrderStateMachine(_statuses(
+        shipped={"next_statuses": ["Delivered"]},
+        cancelled={"requires_products": True}
+    ))
+    assert machine.check("admin", "inprogress", "cancelled", item_count=0) == EMPTY_ORDER
+    assert machine.check("admin", "ordered", "cancelled", item_count=1) is None
+    assert machine.check("admin", "shipped", "cancelled", item_count=1) == NOT_ALLOWED
+    assert machine.check("admin", "shipped", "delivered", item_count=1) == UNKNOWN_STATUS
+    status = machine.status("Shipped")
+    assert machine.status_by_id(str(status["_id"])) is status
@@ -0,0 +1,110 @@
+"""
+Backfill de campos desnormalizados en la colección orders
+
+Las órdenes guardan su estado actual en current_status (id, description,
+changed_at) para no recorrer order_status_record en cada consulta, y la
+cantidad de líneas activas en item_count para validar el checkout sin contar
+order_details. Este script calcula ambos en el servidor para órdenes existentes.
+Requiere que las llaves foráneas ya sean ObjectId (utils.migrate_object_ids).
+
+    python -m utils.backfill_orders
+"""
+import sys
+import asyncio
+import logging
+from dotenv import load_dotenv
+
+from utils.mongodb import get_async_collection, close_mongo
+
+logger = logging.getLogger(__name__)
+
+
+def current_status_backfill_pipeline() -> list:
+    """Pipeline sobre order_status_record que escribe el último estado de cada orden en orders"""
+    return [
+        # Usa el índice id_order_date para tomar el registro más reciente de cada orden
+        {"$sort": {"id_order": 1, "date": -1}},
+        {"$group": {
+            "_id": "$id_order",
+            "id_status": {"$first": "$id_status"},
+            "changed_at": {"$first": "$date"}
+        }},
+        {"$lookup": {
+            "from": "order_statuses",
+            "localField": "id_status",
+            "foreignField": "_id",
+            "as": "status_info"
+        }},
+        {"$project": {
+            "_id": 1,
+            "current_status": {
+                "id": "$id_status",
+                "description": {"$arrayElemAt": ["$status_info.description", 0]},
+                "changed_at": "$changed_at"
+            }
+        }},
+        {"$merge": {
+            "into": "orders",
+            "on": "_id",
+            "whenMatched": "merge",
+            "whenNotMatched": "discard"
+        }}
+    ]
+
+
+def item_count_backfill_pipeline() -> list:
+    """Pipeline sobre orders que cuenta las líneas activas de cada orden y lo escribe en item_count"""
+    return [
+        {"$lookup": {
+            "from": "order_details",
+            "let": {"order_id": "$_id"},
+            "pipeline": [
+                # Usa el índice id_order_active
+                {"$match": {"$expr": {"$and": [
+                    {"$eq": ["$id_order", "$$order_id"]},
+                    {"$eq": ["$active", True]}
+                ]}}},
+                {"$count": "n"}
+            ],
+            "as": "active_lines"
+        }},
+        {"$project": {
+            "_id": 1,
+            "item_count": {"$ifNull": [{"$arrayElemAt": ["$active_lines.n", 0]}, 0]}
+        }},
+        {"$merge": {
+            "into": "orders",
+            "on": "_id",
+            "whenMatched": "merge",
+            "whenNotMatched": "discard"
+        }}
+    ]
+
+
+async def backfill_current_status() -> int:
+    """Escribir current_status en todas las órdenes. Retorna las órdenes que siguen sin estado"""
+    await (await get_async_collection("order_status_record").aggregate(current_status_backfill_pipeline())).to_list()
+    missing = await get_async_collection("orders").count_documents({"current_status": {"$exists": False}})
+    logger.info(f"current_status backfilled, {missing} order(s) without status history")
+    return missing
+
+
+async def backfill_item_count() -> None:
+    """Escribir item_count (líneas activas) en todas las órdenes"""
+    await (await get_async_collection("orders").aggregate(item_count_backfill_pipeline())).to_list()
+    logger.info("item_count backfilled")
+
+
+async def _main() -> int:
+    try:
+        await backfill_current_status()
+        await backfill_item_count()
+        return 0
+    finally:
+        await close_mongo()
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(_main()))
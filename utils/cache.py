@@ -0,0 +1,249 @@
+"""
+Caché compartida entre workers
+
+Abstracción con dos backends:
+
+- MemoryBackend: LRU con TTL dentro del proceso (desarrollo, un solo worker).
+- RedisBackend: cualquier servidor con protocolo Redis (REDIS_URL), compartido
+  por todos los workers y réplicas.
+
+Las llaves llevan la versión de su namespace ("catalogs", "bundles", ...):
+invalidar un namespace es incrementar su versión, las entradas viejas dejan de
+leerse y expiran solas por TTL. Cada invalidación se publica por pub/sub para
+que los demás workers actualicen su versión local y descarten sus copias en
+memoria (ver on_invalidate, usado por utils.reference_cache).
+"""
+import os
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY_PREFIX = os.getenv("CACHE_KEY_PREFIX", "dulceria")
+CACHE_MEMORY_MAX_ENTRIES = int(os.getenv("CACHE_MEMORY_MAX_ENTRIES", os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000")))
+INVALIDATION_CHANNEL = f"{CACHE_KEY_PREFIX}:invalidate"
+
+
+# Funciones a ejecutar en cada worker cuando se invalida un namespace (namespace -> [callback])
+_hooks = {}
+
+
+def on_invalidate(namespace: str, callback):
+    """Registrar una función a ejecutar en cada worker cuando se invalida el namespace"""
+    _hooks.setdefault(namespace, []).append(callback)
+
+
+def _run_hooks(namespace: str):
+    for callback in _hooks.get(namespace, []):
+        callback()
+
+
+class MemoryBackend:
+    """LRU con TTL en memoria; al ser local al proceso no necesita pub/sub"""
+
+    shared = False
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._counters = {}
+
+    async def get(self, key: str) -> bytes:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_counter(self, key: str) -> int:
+        return self._counters.get(key, 0)
+
+    async def incr(self, key: str) -> int:
+        self._counters[key] = self._counters.get(key, 0) + 1
+        return self._counters[key]
+
+    async def publish(self, message: str):
+        pass
+
+    async def close(self):
+        self._entries.clear()
+
+
+class RedisBackend:
+    """Backend con protocolo Redis (redis.asyncio); el cliente se puede inyectar, p. ej. fakeredis en pruebas"""
+
+    shared = True
+
+    def __init__(self, url: str = None, client=None):
+        if client is None:
+            import redis.asyncio as redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self._pubsub = None
+
+    async def get(self, key: str) -> bytes:
+        return await self.client.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self.client.set(key, value, px=int(ttl * 1000))
+
+    async def get_counter(self, key: str) -> int:
+        value = await self.client.get(key)
+        return int(value) if value is not None else 0
+
+    async def incr(self, key: str) -> int:
+        return await self.client.incr(key)
+
+    async def publish(self, message: str):
+        await self.client.publish(INVALIDATION_CHANNEL, message)
+
+    async def listen(self, callback):
+        """Escuchar invalidaciones hasta que se cancele la tarea"""
+        self._pubsub = self.client.pubsub()
+        await self._pubsub.subscribe(INVALIDATION_CHANNEL)
+        try:
+            async for message in self._pubsub.listen():
+                if message.get("type") == "message":
+                    data = message["data"]
+                    callback(data.decode() if isinstance(data, bytes) else data)
+        finally:
+            await self._pubsub.aclose()
+            self._pubsub = None
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class SharedCache:
+    """Llaves versionadas por namespace e invalidación propagada a todos los workers"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._versions = {}
+        self._listener = None
+
+    def _version_key(self, namespace: str) -> str:
+        return f"{CACHE_KEY_PREFIX}:version:{namespace}"
+
+    async def _version(self, namespace: str) -> int:
+        # La versión vigente se mantiene en memoria y se actualiza por pub/sub
+        if namespace not in self._versions:
+            self._versions[namespace] = await self.backend.get_counter(self._version_key(namespace))
+        return self._versions[namespace]
+
+    async def key(self, namespace: str, key: str) -> str:
+        """
+        Llave con la versión vigente del namespace. Calcularla antes de leer de
+        Mongo evita guardar datos viejos bajo una versión invalidada mientras tanto.
+        """
+        return f"{CACHE_KEY_PREFIX}:{namespace}:v{await self._version(namespace)}:{key}"
+
+    async def get(self, versioned_key: str) -> bytes:
+        try:
+            return await self.backend.get(versioned_key)
+        except Exception as e:
+            # Si el backend falla se lee desde Mongo: la caché nunca debe tumbar un request
+            logger.warning(f"Cache get failed ({versioned_key}): {e}")
+            return None
+
+    async def set(self, versioned_key: str, value: bytes, ttl: float):
+        try:
+            await self.backend.set(versioned_key, value, ttl)
+        except Exception as e:
+            logger.warning(f"Cache set failed ({versioned_key}): {e}")
+
+    def _apply(self, namespace: str, version: int):
+        if version > self._versions.get(namespace, -1):
+            self._versions[namespace] = version
+        _run_hooks(namespace)
+
+    def _on_message(self, message: str):
+        namespace, _, version = message.rpartition(":")
+        if namespace and version.isdigit():
+            self._apply(namespace, int(version))
+
+    async def invalidate(self, *namespaces: str):
+        for namespace in namespaces:
+            try:
+                version = await self.backend.incr(self._version_key(namespace))
+                self._apply(namespace, version)
+                await self.backend.publish(f"{namespace}:{version}")
+            except Exception as e:
+                # Sin backend disponible al menos se invalida este worker; el resto expira por TTL
+                logger.warning(f"Cache invalidation failed ({namespace}): {e}")
+                self._versions.pop(namespace, None)
+                _run_hooks(namespace)
+
+    async def _listen_forever(self):
+        while True:
+            try:
+                await self.backend.listen(self._on_message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Cache invalidation listener failed, reconnecting: {e}")
+            # Pudimos perder mensajes mientras no escuchábamos: releer versiones y recargar tablas
+            self._versions.clear()
+            for namespace in list(_hooks):
+                _run_hooks(namespace)
+            await asyncio.sleep(1)
+
+    def start(self):
+        """Iniciar la escucha de invalidaciones (lifespan)"""
+        if self.backend.shared and self._listener is None:
+            self._listener = asyncio.create_task(self._listen_forever())
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        await self.backend.close()
+
+
+def _create_backend():
+    redis_url = os.getenv("REDIS_URL")
+    if redis_url:
+        logger.info("Using Redis cache backend")
+        return RedisBackend(redis_url)
+    if int(os.getenv("WEB_CONCURRENCY", "1")) > 1:
+        # Cada worker invalida solo su propia memoria: los demás sirven datos viejos hasta el TTL
+        logger.warning("REDIS_URL is not set with WEB_CONCURRENCY > 1: each worker keeps its own cache and invalidations are not shared")
+    return MemoryBackend(CACHE_MEMORY_MAX_ENTRIES)
+
+
+_shared_cache = None
+
+def get_cache() -> SharedCache:
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = SharedCache(_create_backend())
+    return _shared_cache
+
+
+async def invalidate_cache(*namespaces: str):
+    """Invalidar namespaces en todos los workers (llamado desde los controllers de escritura)"""
+    await get_cache().invalidate(*namespaces)
+
+
+async def close_cache():
+    """Detener el listener y cerrar el backend (lifespan)"""
+    global _shared_cache
+    if _shared_cache is not None:
+        await _shared_cache.stop()
+        _shared_cache = None
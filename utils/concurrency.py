@@ -0,0 +1,24 @@
+"""
+Consultas independientes en paralelo
+
+Los controladores validan varias cosas antes de escribir (orden, producto,
+estado, conteo de líneas). Cuando esas lecturas no dependen entre sí se lanzan
+juntas con asyncio.TaskGroup: la latencia queda en la consulta más lenta y no
+en la suma, y si una falla las demás se cancelan.
+"""
+import asyncio
+
+
+async def fan_out(*aws) -> list:
+    """
+    Ejecutar las corrutinas concurrentemente y retornar sus resultados en el mismo orden.
+    Si una lanza una excepción se cancelan las restantes y se relanza esa excepción
+    (sin el ExceptionGroup), para que los except de los controladores sigan funcionando igual.
+    """
+    try:
+        async with asyncio.TaskGroup() as tg:
+            tasks = [tg.create_task(aw) for aw in aws]
+    except BaseExceptionGroup as group:
+        raise group.exceptions[0] from None
+
+    return [task.result() for task in tasks]
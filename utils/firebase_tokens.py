@@ -0,0 +1,141 @@
+"""
+Verificación local de ID tokens de Firebase
+
+Los ID tokens que Firebase emite en el cliente están firmados con RS256 por
+llaves públicas de Google. Las llaves se descargan una vez, se guardan en
+memoria durante el max-age que indica Google y se rotan en segundo plano, así
+el login con ID token no depende de una llamada externa por request.
+"""
+import os
+import re
+import time
+import asyncio
+import logging
+import jwt
+from cryptography import x509
+
+from utils.http_client import request_with_retry
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_CERTS_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+DEFAULT_KEYS_MAX_AGE = 3600
+# Renovar las llaves un poco antes de que expiren
+KEYS_REFRESH_MARGIN = 300
+# Tiempo mínimo entre recargas forzadas por un kid desconocido
+MIN_FORCED_REFRESH_INTERVAL = 30
+TOKEN_LEEWAY_SECONDS = 60
+
+_keys = {}
+_keys_expires_at = 0.0
+_last_refresh = 0.0
+_keys_lock = asyncio.Lock()
+_rotation_task = None
+
+
+def get_project_id() -> str:
+    project_id = os.getenv("FIREBASE_PROJECT_ID") or os.getenv("GOOGLE_CLOUD_PROJECT")
+    if not project_id:
+        raise ValueError("Firebase project id not found. Set FIREBASE_PROJECT_ID environment variable")
+    return project_id
+
+
+def _parse_max_age(cache_control: str) -> int:
+    match = re.search(r"max-age=(\d+)", cache_control or "")
+    return int(match.group(1)) if match else DEFAULT_KEYS_MAX_AGE
+
+
+def set_signing_keys(keys: dict, max_age: int = DEFAULT_KEYS_MAX_AGE):
+    """Reemplazar las llaves en memoria ({kid: llave pública}); también usado por las pruebas"""
+    global _keys, _keys_expires_at, _last_refresh
+    _keys = dict(keys)
+    _last_refresh = time.monotonic()
+    _keys_expires_at = _last_refresh + max_age
+
+
+async def refresh_signing_keys():
+    """Descargar los certificados x509 de Google y cargarlos como llaves públicas"""
+    response = await request_with_retry("GET", GOOGLE_CERTS_URL)
+    response.raise_for_status()
+
+    keys = {
+        kid: x509.load_pem_x509_certificate(cert.encode()).public_key()
+        for kid, cert in response.json().items()
+    }
+    max_age = _parse_max_age(response.headers.get("cache-control"))
+    set_signing_keys(keys, max_age)
+    logger.info(f"Firebase signing keys refreshed ({len(keys)} keys, max-age {max_age}s)")
+
+
+def _needs_refresh(kid: str) -> bool:
+    now = time.monotonic()
+    if now >= _keys_expires_at:
+        return True
+    # Un kid desconocido puede indicar una rotación reciente: recargar, con límite de frecuencia
+    return kid not in _keys and now - _last_refresh >= MIN_FORCED_REFRESH_INTERVAL
+
+
+async def get_signing_key(kid: str):
+    if _needs_refresh(kid):
+        async with _keys_lock:
+            if _needs_refresh(kid):
+                await refresh_signing_keys()
+    return _keys.get(kid)
+
+
+async def verify_firebase_id_token(id_token: str) -> dict:
+    """Validar firma, audiencia, emisor y vigencia de un ID token. Lanza jwt.InvalidTokenError si no es válido"""
+    header = jwt.get_unverified_header(id_token)
+    if header.get("alg") != "RS256":
+        raise jwt.InvalidAlgorithmError("Unexpected token algorithm")
+
+    key = await get_signing_key(header.get("kid"))
+    if key is None:
+        raise jwt.InvalidSignatureError("Unknown signing key")
+
+    project_id = get_project_id()
+    claims = jwt.decode(
+        id_token
+        , key
+        , algorithms=["RS256"]
+        , audience=project_id
+        , issuer=f"https://securetoken.google.com/{project_id}"
+        , leeway=TOKEN_LEEWAY_SECONDS
+        , options={"require": ["exp", "iat", "aud", "iss", "sub"]}
+    )
+
+    if not claims["sub"]:
+        raise jwt.InvalidTokenError("Empty subject")
+    if claims.get("auth_time", 0) > time.time() + TOKEN_LEEWAY_SECONDS:
+        raise jwt.ImmatureSignatureError("auth_time is in the future")
+
+    return claims
+
+
+async def _rotation_loop():
+    while True:
+        try:
+            await refresh_signing_keys()
+            delay = max(_keys_expires_at - time.monotonic() - KEYS_REFRESH_MARGIN, MIN_FORCED_REFRESH_INTERVAL)
+        except Exception as e:
+            logger.warning(f"Firebase signing keys refresh failed: {e}")
+            delay = MIN_FORCED_REFRESH_INTERVAL
+        await asyncio.sleep(delay)
+
+
+def start_key_rotation():
+    """Iniciar la rotación de llaves en segundo plano (lifespan)"""
+    global _rotation_task
+    if _rotation_task is None:
+        _rotation_task = asyncio.create_task(_rotation_loop())
+
+
+async def stop_key_rotation():
+    global _rotation_task
+    if _rotation_task is not None:
+        _rotation_task.cancel()
+        try:
+            await _rotation_task
+        except asyncio.CancelledError:
+            pass
+        _rotation_task = None
@@ -0,0 +1,58 @@
+"""
+Cliente HTTP asíncrono compartido para servicios externos (Firebase)
+
+Un solo httpx.AsyncClient por proceso con conexiones keep-alive, timeouts
+acotados y reintentos con jitter. Se cierra desde el lifespan de FastAPI.
+"""
+import os
+import random
+import asyncio
+import logging
+import httpx
+
+logger = logging.getLogger(__name__)
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "5"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+HTTP_RETRY_BASE_DELAY = float(os.getenv("HTTP_RETRY_BASE_DELAY", "0.2"))
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+_http_client = None
+
+def get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE
+            )
+        )
+    return _http_client
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+async def request_with_retry(method: str, url: str, **kwargs) -> httpx.Response:
+    """Request con reintentos ante errores de red o respuestas 429/5xx (backoff exponencial con full jitter)"""
+    client = get_http_client()
+    for attempt in range(HTTP_RETRIES + 1):
+        try:
+            response = await client.request(method, url, **kwargs)
+            if response.status_code not in RETRY_STATUS_CODES or attempt == HTTP_RETRIES:
+                return response
+            logger.warning(f"{method} {httpx.URL(url).host} returned {response.status_code}, retrying")
+        except httpx.TransportError as e:
+            if attempt == HTTP_RETRIES:
+                raise
+            logger.warning(f"{method} {httpx.URL(url).host} failed ({type(e).__name__}), retrying")
+
+        await asyncio.sleep(random.uniform(0, HTTP_RETRY_BASE_DELAY * (2 ** attempt)))
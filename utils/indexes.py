@@ -0,0 +1,185 @@
+"""
+Manifiesto de índices de MongoDB
+
+Declara todos los índices de los que dependen las consultas en pipelines/ y
+controllers/. Se aplica de forma idempotente al arrancar la aplicación
+(ver lifespan en main.py) o desde la línea de comandos:
+
+    python -m utils.indexes           # crear los índices faltantes
+    python -m utils.indexes --check   # solo reportar los faltantes
+"""
+import sys
+import asyncio
+import logging
+from dotenv import load_dotenv
+from pymongo import IndexModel, ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+from utils.mongodb import get_async_collection, close_mongo
+
+logger = logging.getLogger(__name__)
+
+INDEXES = {
+    "orders": [
+        # Listado por usuario ordenado por fecha (paginación por offset y por cursor date + _id)
+        IndexModel([("id_user", ASCENDING), ("date", DESCENDING), ("_id", DESCENDING)], name="id_user_date_id"),
+        # Carrito en progreso del usuario (create_order)
+        IndexModel([("id_user", ASCENDING), ("current_status.description", ASCENDING)], name="id_user_current_status"),
+        # Listado de todas las órdenes ordenado por fecha (paginación por offset y por cursor)
+        IndexModel([("date", DESCENDING), ("_id", DESCENDING)], name="date_id"),
+    ],
+    "order_details": [
+        # Detalles activos de una orden (get_order_details, recalculate_order_totals, validación de orden vacía)
+        IndexModel([("id_order", ASCENDING), ("active", ASCENDING)], name="id_order_active"),
+        # Una sola línea activa por producto en cada orden: respalda el upsert con $inc de create_order_detail
+        IndexModel(
+            [("id_order", ASCENDING), ("id_producto", ASCENDING)],
+            name="id_order_id_producto_active",
+            unique=True,
+            partialFilterExpression={"active": True}
+        ),
+    ],
+    "order_status_record": [
+        # Estado más reciente de una orden (sort por fecha descendente)
+        IndexModel([("id_order", ASCENDING), ("date", DESCENDING)], name="id_order_date"),
+    ],
+    "order_statuses": [
+        IndexModel([("description", ASCENDING)], name="description", unique=True),
+    ],
+    "users": [
+        # Login busca por email
+        IndexModel([("email", ASCENDING)], name="email", unique=True),
+    ],
+    "catalogs": [
+        # Catálogos por tipo y conteo de activos
+        IndexModel([("id_catalog_type", ASCENDING), ("active", ASCENDING)], name="id_catalog_type_active"),
+        IndexModel([("active", ASCENDING)], name="active"),
+    ],
+    "catalogtypes": [
+        IndexModel([("description", ASCENDING)], name="description"),
+    ],
+    "bundle_details": [
+        # Productos de un bundle y verificación de producto existente
+        IndexModel([("id_bundle", ASCENDING), ("id_producto", ASCENDING)], name="id_bundle_id_producto"),
+    ],
+    "app_settings": [
+        IndexModel([("key", ASCENDING)], name="key", unique=True),
+    ],
+    "refresh_tokens": [
+        # /token/refresh busca solo por el hash del token
+        IndexModel([("token_hash", ASCENDING)], name="token_hash", unique=True),
+        # Revocación de todos los tokens de un login
+        IndexModel([("family", ASCENDING)], name="family"),
+        # Revocación de todas las sesiones de un usuario al cambiar active/admin
+        IndexModel([("user_id", ASCENDING)], name="user_id"),
+        # Mongo elimina los tokens vencidos
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+}
+
+# Índices reemplazados por otros del manifiesto: índice viejo -> índice que lo reemplaza.
+# El viejo solo se elimina cuando el nuevo ya existe
+OBSOLETE_INDEXES = {
+    "order_details": {"id_order_id_producto": "id_order_id_producto_active"},
+}
+
+INDEX_NOT_FOUND = 27
+
+# Índices del manifiesto cuya existencia se verificó en este proceso (colección, nombre)
+_confirmed = set()
+
+
+def index_confirmed(collection_name: str, name: str) -> bool:
+    """
+    True si el índice se verificó o creó en este proceso. Los controladores que dependen de un
+    índice único usan su validación previa mientras no esté confirmado.
+    """
+    return (collection_name, name) in _confirmed
+
+
+def _index_key(index: IndexModel) -> list:
+    return list(index.document["key"].items())
+
+
+def _index_signature(spec: dict) -> tuple:
+    """Llave más las opciones que cambian el comportamiento del índice (unique, filtro parcial)"""
+    return (
+        list(spec["key"].items()),
+        bool(spec.get("unique", False)),
+        dict(spec.get("partialFilterExpression") or {})
+    )
+
+
+async def find_missing_indexes() -> list:
+    """Retorna los índices del manifiesto que no existen en la base de datos"""
+    missing = []
+    for collection_name, indexes in INDEXES.items():
+        coll = get_async_collection(collection_name)
+        existing = [_index_signature(idx) async for idx in await coll.list_indexes()]
+
+        for index in indexes:
+            if _index_signature(index.document) in existing:
+                _confirmed.add((collection_name, index.document["name"]))
+            else:
+                _confirmed.discard((collection_name, index.document["name"]))
+                missing.append({
+                    "collection": collection_name,
+                    "name": index.document["name"],
+                    "key": _index_key(index)
+                })
+    return missing
+
+
+async def ensure_indexes() -> list:
+    """Crear los índices faltantes del manifiesto (idempotente). Retorna los que no se pudieron crear"""
+    failed = []
+    for index in await find_missing_indexes():
+        coll = get_async_collection(index["collection"])
+        model = next(i for i in INDEXES[index["collection"]] if i.document["name"] == index["name"])
+        try:
+            await coll.create_indexes([model])
+            _confirmed.add((index["collection"], index["name"]))
+            logger.info(f"Index created: {index['collection']}.{index['name']}")
+        except Exception as e:
+            logger.error(f"Error creating index {index['collection']}.{index['name']}: {e}")
+            failed.append({**index, "error": str(e)})
+
+    # Eliminar los índices reemplazados solo si su reemplazo ya existe
+    for collection_name, replacements in OBSOLETE_INDEXES.items():
+        coll = get_async_collection(collection_name)
+        for old_name, new_name in replacements.items():
+            if not index_confirmed(collection_name, new_name):
+                logger.warning(f"Keeping {collection_name}.{old_name}: replacement {new_name} does not exist")
+                continue
+            try:
+                await coll.drop_index(old_name)
+                logger.info(f"Obsolete index dropped: {collection_name}.{old_name}")
+            except OperationFailure as e:
+                # Ya no existe (o lo eliminó otro worker al mismo tiempo)
+                if e.code != INDEX_NOT_FOUND:
+                    raise
+    return failed
+
+
+async def _main(check_only: bool) -> int:
+    try:
+        if check_only:
+            missing = await find_missing_indexes()
+            for index in missing:
+                print(f"MISSING {index['collection']}.{index['name']} {index['key']}")
+            print(f"{len(missing)} missing index(es)")
+            return 1 if missing else 0
+
+        failed = await ensure_indexes()
+        for index in failed:
+            print(f"FAILED {index['collection']}.{index['name']}: {index['error']}")
+        print("Indexes up to date" if not failed else f"{len(failed)} index(es) could not be created")
+        return 1 if failed else 0
+    finally:
+        await close_mongo()
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(_main("--check" in sys.argv[1:])))
@@ -0,0 +1,90 @@
+"""
+Migración de llaves foráneas string -> ObjectId
+
+Las llaves foráneas se guardaban como string, lo que obligaba a las pipelines a
+convertir con $toObjectId/$toString dentro de let/$expr y evitaba que el $lookup
+usara índices. Esta migración reescribe esos campos como ObjectId nativos en el
+servidor (update_many con pipeline), es idempotente y se puede repetir.
+
+    python -m utils.migrate_object_ids            # aplicar la migración
+    python -m utils.migrate_object_ids --dry-run  # solo contar documentos pendientes
+"""
+import sys
+import asyncio
+import logging
+from dotenv import load_dotenv
+
+from utils.mongodb import get_async_collection, close_mongo
+
+logger = logging.getLogger(__name__)
+
+FOREIGN_KEYS = {
+    "orders": ["id_user"],
+    "order_details": ["id_order", "id_producto"],
+    "order_status_record": ["id_order", "id_status"],
+    "catalogs": ["id_catalog_type"],
+    "bundle_details": ["id_producto"],
+}
+
+
+def _pending_filter(fields: list) -> dict:
+    return {"$or": [{field: {"$type": "string"}} for field in fields]}
+
+
+def _conversion_stage(fields: list) -> dict:
+    # Si el string no es un ObjectId válido se conserva el valor original
+    return {"$set": {
+        field: {
+            "$convert": {
+                "input": f"${field}",
+                "to": "objectId",
+                "onError": f"${field}",
+                "onNull": f"${field}"
+            }
+        }
+        for field in fields
+    }}
+
+
+async def count_pending() -> dict:
+    """Cantidad de documentos que aún tienen llaves foráneas como string, por colección"""
+    pending = {}
+    for collection_name, fields in FOREIGN_KEYS.items():
+        coll = get_async_collection(collection_name)
+        pending[collection_name] = await coll.count_documents(_pending_filter(fields))
+    return pending
+
+
+async def migrate_object_ids() -> dict:
+    """Convertir las llaves foráneas string a ObjectId. Retorna los documentos modificados por colección"""
+    modified = {}
+    for collection_name, fields in FOREIGN_KEYS.items():
+        coll = get_async_collection(collection_name)
+        result = await coll.update_many(_pending_filter(fields), [_conversion_stage(fields)])
+        modified[collection_name] = result.modified_count
+        logger.info(f"{collection_name}: {result.modified_count} document(s) migrated ({', '.join(fields)})")
+    return modified
+
+
+async def _main(dry_run: bool) -> int:
+    try:
+        if dry_run:
+            for collection_name, count in (await count_pending()).items():
+                print(f"{collection_name}: {count} document(s) pending")
+            return 0
+
+        await migrate_object_ids()
+
+        # Documentos que quedaron con strings (IDs inválidos que no se pudieron convertir)
+        remaining = {name: count for name, count in (await count_pending()).items() if count}
+        for collection_name, count in remaining.items():
+            print(f"{collection_name}: {count} document(s) with invalid ids were left unchanged")
+        return 1 if remaining else 0
+    finally:
+        await close_mongo()
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(_main("--dry-run" in sys.argv[1:])))
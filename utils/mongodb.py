@@ -1,39 +1,116 @@
 import os
-from dotenv import load_dotenv
-from pymongo import MongoClient
+import asyncio
+import logging
+from pymongo import MongoClient, AsyncMongoClient
 from pymongo.server_api import ServerApi
 
-load_dotenv()
+logger = logging.getLogger(__name__)
 
-# Try both variable names for compatibility
-DB = os.getenv("DATABASE_NAME") or os.getenv("MONGO_DB_NAME")
-URI = os.getenv("MONGODB_URI") or os.getenv("URI")
+_client = None
+_async_client = None
 
-# Validate that we have the required environment variables
-if not DB:
-    raise ValueError("Database name not found. Set DATABASE_NAME or MONGO_DB_NAME environment variable")
-if not URI:
-    raise ValueError("MongoDB URI not found. Set MONGODB_URI or URI environment variable")
+# Las variables de entorno se leen al crear el primer cliente, no al importar el módulo
+def get_database_name() -> str:
+    # Try both variable names for compatibility
+    db = os.getenv("DATABASE_NAME") or os.getenv("MONGO_DB_NAME")
+    if not db:
+        raise ValueError("Database name not found. Set DATABASE_NAME or MONGO_DB_NAME environment variable")
+    return db
 
+def get_mongo_uri() -> str:
+    uri = os.getenv("MONGODB_URI") or os.getenv("URI")
+    if not uri:
+        raise ValueError("MongoDB URI not found. Set MONGODB_URI or URI environment variable")
+    return uri
 
-_client = None
+# Conexiones totales que puede abrir el servicio contra el cluster, sumando todos los workers
+DEFAULT_TOTAL_MAX_CONNECTIONS = 100
+
+def _max_pool_size() -> int:
+    # Cada worker tiene su propio pool: el presupuesto total se reparte siempre entre WEB_CONCURRENCY
+    total = int(os.getenv("MONGO_TOTAL_MAX_CONNECTIONS", DEFAULT_TOTAL_MAX_CONNECTIONS))
+    workers = max(int(os.getenv("WEB_CONCURRENCY", "1")), 1)
+    per_worker = max(total // workers, 1)
+
+    # MONGO_MAX_POOL_SIZE solo puede reducir la porción de cada worker, nunca exceder el presupuesto
+    if os.getenv("MONGO_MAX_POOL_SIZE"):
+        return max(min(int(os.getenv("MONGO_MAX_POOL_SIZE")), per_worker), 1)
+
+    return per_worker
+
+def get_pool_settings() -> dict:
+    """Configuración del pool de conexiones (sobrescribible por variables de entorno)"""
+    max_pool_size = _max_pool_size()
+    return {
+        "maxPoolSize": max_pool_size,
+        "minPoolSize": min(int(os.getenv("MONGO_MIN_POOL_SIZE", "5")), max_pool_size),
+        "maxIdleTimeMS": int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000")),
+        "waitQueueTimeoutMS": int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000"))
+    }
+
+def _client_options() -> dict:
+    return {
+        "server_api": ServerApi("1"),
+        "tls": True,
+        "tlsAllowInvalidCertificates": True,
+        "serverSelectionTimeoutMS": 5000,  # Timeout más corto
+        **get_pool_settings()
+    }
 
 def get_mongo_client():
     global _client
     if _client is None:
-        _client = MongoClient(
-            URI,
-            server_api=ServerApi("1"),
-            tls=True,
-            tlsAllowInvalidCertificates=True,
-            serverSelectionTimeoutMS=5000  # Timeout más corto
-        )
+        _client = MongoClient(get_mongo_uri(), **_client_options())
     return _client
 
 def get_collection(col):
     """Obtiene una colección de MongoDB"""
     client = get_mongo_client()
-    return client[DB][col]
+    return client[get_database_name()][col]
+
+def get_async_mongo_client():
+    """Cliente asíncrono de MongoDB para usar desde los controllers (no bloquea el event loop)"""
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncMongoClient(get_mongo_uri(), **_client_options())
+    return _async_client
+
+def get_async_collection(col):
+    """Obtiene una colección de MongoDB con el cliente asíncrono"""
+    client = get_async_mongo_client()
+    return client[get_database_name()][col]
+
+async def run_in_transaction(callback):
+    """
+    Ejecutar callback(session) dentro de una transacción y retornar su resultado.
+    with_transaction reintenta ante errores transitorios, así que el callback puede correr más de una vez.
+    """
+    client = get_async_mongo_client()
+    async with client.start_session() as session:
+        return await session.with_transaction(callback)
+
+async def connect_mongo():
+    """Abrir el cliente asíncrono y precalentar el pool (llamado desde el lifespan de FastAPI)"""
+    client = get_async_mongo_client()
+    await client.aconnect()
+    pool = get_pool_settings()
+
+    # Un ping por conexión mínima del pool, en paralelo, para que el handshake TLS
+    # y la selección de servidor ocurran antes de recibir tráfico
+    await asyncio.gather(*(
+        client.admin.command("ping") for _ in range(max(pool["minPoolSize"], 1))
+    ))
+    logger.info(f"MongoDB pool ready (minPoolSize={pool['minPoolSize']}, maxPoolSize={pool['maxPoolSize']})")
+
+async def close_mongo():
+    """Cerrar los clientes de MongoDB (llamado al apagar la aplicación)"""
+    global _client, _async_client
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
+    if _client is not None:
+        _client.close()
+        _client = None
 
 def t_connection():
     try:
@@ -42,4 +119,13 @@ def t_connection():
         return True
     except Exception as e:
         print(f"Error connecting to MongoDB: {e}")
-        return False
\ No newline at end of file
+        return False
+
+async def async_t_connection():
+    try:
+        client = get_async_mongo_client()
+        await client.admin.command("ping")
+        return True
+    except Exception as e:
+        print(f"Error connecting to MongoDB: {e}")
+        return False
@@ -0,0 +1,117 @@
+"""
+Máquina de estados de las órdenes
+
+Las reglas de transición se declaran aquí (y opcionalmente en cada documento de
+order_statuses) y se compilan en diccionarios en memoria a partir de la tabla
+order_statuses de la caché de referencia. Validar una transición es una
+búsqueda en diccionario, sin consultas a la base de datos.
+
+La tabla se recompila cuando la caché de referencia recarga order_statuses:
+por TTL o por invalidate_cache("order_statuses"), que llaman los endpoints de
+controllers/order_statuses.py al escribir (en todos los workers vía pub/sub).
+
+Campos opcionales en un documento de order_statuses:
+    requires_products: bool   la orden debe tener líneas activas para entrar al estado
+    next_statuses: [str]      estados a los que un admin puede mover la orden desde este
+"""
+import asyncio
+from bson import ObjectId
+
+from utils.reference_cache import order_statuses
+
+ANY = "*"
+
+# Transiciones permitidas por rol: estado actual -> estados destino (ANY = cualquiera)
+TRANSITIONS = {
+    # Los usuarios solo pueden finalizar su carrito
+    "user": {
+        "inprogress": {"ordered"},
+    },
+    # Los admins pueden mover cualquier orden a cualquier estado (salvo next_statuses en el documento)
+    "admin": {
+        ANY: {ANY},
+    },
+}
+
+# Estados a los que no se puede entrar con la orden vacía
+REQUIRES_PRODUCTS = {"ordered", "shipped", "delivered", "processing"}
+
+# Resultados de check()
+ALLOWED = None
+NOT_ALLOWED = "not_allowed"
+EMPTY_ORDER = "empty_order"
+UNKNOWN_STATUS = "unknown_status"
+
+
+class OrderStateMachine:
+    """Tabla de estados y transiciones compilada en memoria"""
+
+    def __init__(self, statuses: list, version: int = 0):
+        self.version = version
+        self.by_id = {}
+        self.by_description = {}
+        self.requires_products = set()
+        self.transitions = {role: {state: set(targets) for state, targets in rules.items()}
+                            for role, rules in TRANSITIONS.items()}
+
+        for status in statuses:
+            description = status.get("description")
+            if not isinstance(description, str):
+                continue
+            description = description.strip().lower()
+            self.by_id[status["_id"]] = status
+            self.by_description[description] = status
+
+            requires = status.get("requires_products")
+            if requires is None:
+                requires = description in REQUIRES_PRODUCTS
+            if requires:
+                self.requires_products.add(description)
+
+            next_statuses = status.get("next_statuses")
+            if next_statuses is not None:
+                self.transitions["admin"][description] = {s.strip().lower() for s in next_statuses}
+
+    def status(self, description: str) -> dict:
+        return self.by_description.get(description.strip().lower())
+
+    def status_by_id(self, status_id) -> dict:
+        if not isinstance(status_id, ObjectId):
+            if not ObjectId.is_valid(status_id):
+                return None
+            status_id = ObjectId(status_id)
+        return self.by_id.get(status_id)
+
+    def can_transition(self, role: str, current: str, target: str) -> bool:
+        rules = self.transitions.get(role, {})
+        targets = rules.get(current, rules.get(ANY, set()))
+        return ANY in targets or target in targets
+
+    def check(self, role: str, current: str, target: str, item_count: int) -> str:
+        """
+        Validar la transición current -> target para el rol.
+        Retorna ALLOWED (None) o el motivo del rechazo: NOT_ALLOWED, EMPTY_ORDER o UNKNOWN_STATUS.
+        """
+        if target not in self.by_description:
+            return UNKNOWN_STATUS
+        if not self.can_transition(role, current, target):
+            return NOT_ALLOWED
+        if target in self.requires_products and item_count == 0:
+            return EMPTY_ORDER
+        return ALLOWED
+
+
+_machine = OrderStateMachine([])
+_lock = asyncio.Lock()
+
+
+async def get_state_machine() -> OrderStateMachine:
+    """Máquina de estados vigente; se recompila solo si la tabla order_statuses se recargó"""
+    global _machine
+    version = await order_statuses.load_if_stale()
+    if _machine.version != version:
+        async with _lock:
+            if _machine.version != version:
+                statuses = await order_statuses.all()
+                _machine = OrderStateMachine(statuses, order_statuses.version)
+    return _machine
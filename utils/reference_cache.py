@@ -0,0 +1,125 @@
+"""
+Caché en memoria de datos de referencia
+
+Colecciones pequeñas y casi estáticas (order_statuses, catalogtypes,
+app_settings) que se consultaban en cada request. Cada tabla se carga completa
+la primera vez, expira por TTL y se invalida explícitamente desde los endpoints
+de administración que la modifican.
+
+Con varios workers la invalidación llega a todos por pub/sub (utils.cache).
+
+Los documentos retornados son compartidos: no deben modificarse.
+"""
+import os
+import time
+import asyncio
+from bson import ObjectId
+
+from utils.mongodb import get_async_collection
+from utils.cache import on_invalidate
+
+REFERENCE_CACHE_TTL_SECONDS = float(os.getenv("REFERENCE_CACHE_TTL_SECONDS", "300"))
+
+
+class ReferenceTable:
+    """Copia en memoria de una colección indexada por _id y por un campo de búsqueda"""
+
+    def __init__(self, collection_name: str, key_field: str):
+        self.collection_name = collection_name
+        self.key_field = key_field
+        self._by_id = {}
+        self._by_key = {}
+        self._loaded_at = None
+        self._lock = asyncio.Lock()
+        # Aumenta en cada recarga; permite a quien deriva estructuras de la tabla saber cuándo reconstruirlas
+        self.version = 0
+
+    def _is_fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < REFERENCE_CACHE_TTL_SECONDS
+
+    async def _load(self):
+        coll = get_async_collection(self.collection_name)
+        by_id, by_key = {}, {}
+        async for doc in coll.find({}):
+            by_id[doc["_id"]] = doc
+            key = doc.get(self.key_field)
+            if isinstance(key, str):
+                by_key[key.strip().lower()] = doc
+        self._by_id, self._by_key = by_id, by_key
+        self._loaded_at = time.monotonic()
+        self.version += 1
+
+    async def _ensure_loaded(self):
+        if self._is_fresh():
+            return
+        # Un solo request recarga la tabla, los demás esperan el resultado
+        async with self._lock:
+            if not self._is_fresh():
+                await self._load()
+
+    async def load_if_stale(self) -> int:
+        """Recargar la tabla si expiró o fue invalidada. Retorna la versión vigente"""
+        await self._ensure_loaded()
+        return self.version
+
+    async def get_by_id(self, doc_id) -> dict:
+        if not isinstance(doc_id, ObjectId):
+            if not ObjectId.is_valid(doc_id):
+                return None
+            doc_id = ObjectId(doc_id)
+        await self._ensure_loaded()
+        return self._by_id.get(doc_id)
+
+    async def get_by_key(self, key: str) -> dict:
+        await self._ensure_loaded()
+        return self._by_key.get(key.strip().lower())
+
+    async def all(self) -> list:
+        await self._ensure_loaded()
+        return list(self._by_id.values())
+
+    def invalidate(self):
+        self._loaded_at = None
+
+
+order_statuses = ReferenceTable("order_statuses", "description")
+catalog_types = ReferenceTable("catalogtypes", "description")
+app_settings = ReferenceTable("app_settings", "key")
+
+_TABLES = {
+    "order_statuses": order_statuses,
+    "catalogtypes": catalog_types,
+    "app_settings": app_settings,
+}
+
+# invalidate_cache("order_statuses") en cualquier worker descarta la tabla en todos
+for _name, _table in _TABLES.items():
+    on_invalidate(_name, _table.invalidate)
+
+
+async def get_order_status_by_description(description: str) -> dict:
+    return await order_statuses.get_by_key(description)
+
+
+async def get_order_status_by_id(status_id) -> dict:
+    return await order_statuses.get_by_id(status_id)
+
+
+async def get_catalog_type_by_description(description: str) -> dict:
+    return await catalog_types.get_by_key(description)
+
+
+async def get_setting(key: str, default=None):
+    setting = await app_settings.get_by_key(key)
+    if setting and "value" in setting:
+        return setting["value"]
+    return default
+
+
+def invalidate(collection_name: str = None):
+    """Invalidar una tabla (o todas si no se indica) para que se recargue en el siguiente acceso"""
+    if collection_name is None:
+        for table in _TABLES.values():
+            table.invalidate()
+    else:
+        _TABLES[collection_name].invalidate()
@@ -0,0 +1,122 @@
+"""
+Refresh tokens opacos
+
+El access token (JWT) dura 1 hora; el refresh token permite renovarlo sin pasar
+otra vez por Firebase ni por la colección users. En Mongo solo se guarda el
+sha256 del token junto con los datos del usuario necesarios para emitir el JWT.
+Los documentos vencidos los elimina el índice TTL sobre expires_at.
+
+Cada uso rota el token (el anterior queda revocado). Todos los tokens que nacen
+de un mismo login comparten "family": si se presenta un token ya rotado se
+asume robo y se revoca la familia completa. La familia vence en una fecha fija
+desde el login (la rotación no la extiende), y se revoca completa cuando cambian
+active o admin del usuario (revoke_user_sessions) para que los datos copiados
+del usuario no sobrevivan al cambio.
+"""
+import os
+import secrets
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from utils.mongodb import get_async_collection
+
+logger = logging.getLogger(__name__)
+
+REFRESH_TOKEN_TTL_DAYS = int(os.getenv("REFRESH_TOKEN_TTL_DAYS", "30"))
+
+
+def _hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def user_claims(user_info: dict) -> dict:
+    """Datos del usuario que se guardan con el refresh token para emitir el JWT"""
+    return {
+        "id": str(user_info["_id"]),
+        "firstname": user_info["name"],
+        "lastname": user_info["lastname"],
+        "email": user_info["email"],
+        "active": user_info["active"],
+        "admin": user_info["admin"]
+    }
+
+
+async def issue_refresh_token(claims: dict, family: str = None, expires_at: datetime = None) -> str:
+    """
+    Crear un refresh token nuevo. Sin family se inicia una familia nueva (login) que vence
+    en REFRESH_TOKEN_TTL_DAYS; al rotar se pasa el expires_at de la familia para no extenderla.
+    """
+    token = secrets.token_urlsafe(48)
+    now = datetime.utcnow()
+
+    coll = get_async_collection("refresh_tokens")
+    await coll.insert_one({
+        "token_hash": _hash_token(token),
+        "family": family or secrets.token_hex(16),
+        "user_id": ObjectId(claims["id"]),
+        "user": claims,
+        "revoked": False,
+        "created_at": now,
+        "expires_at": expires_at or now + timedelta(days=REFRESH_TOKEN_TTL_DAYS)
+    })
+    return token
+
+
+async def rotate_refresh_token(token: str) -> tuple:
+    """
+    Consumir un refresh token y emitir su reemplazo.
+    Retorna (nuevo_token, claims) o None si el token no es válido.
+    """
+    coll = get_async_collection("refresh_tokens")
+    token_hash = _hash_token(token)
+    now = datetime.utcnow()
+
+    # Marcar como revocado de forma atómica: dos requests con el mismo token no pueden rotarlo ambos
+    current = await coll.find_one_and_update(
+        {"token_hash": token_hash, "revoked": False, "expires_at": {"$gt": now}},
+        {"$set": {"revoked": True, "revoked_at": now}},
+        projection={"family": 1, "user": 1, "expires_at": 1},
+        return_document=ReturnDocument.BEFORE
+    )
+
+    if current is None:
+        reused = await coll.find_one({"token_hash": token_hash, "revoked": True}, {"family": 1})
+        if reused:
+            logger.warning(f"Refresh token reuse detected, revoking family {reused['family']}")
+            await revoke_family(reused["family"])
+        return None
+
+    new_token = await issue_refresh_token(current["user"], current["family"], current["expires_at"])
+    return new_token, current["user"]
+
+
+async def revoke_family(family: str) -> int:
+    coll = get_async_collection("refresh_tokens")
+    result = await coll.update_many(
+        {"family": family, "revoked": False},
+        {"$set": {"revoked": True, "revoked_at": datetime.utcnow()}}
+    )
+    return result.modified_count
+
+
+async def revoke_user_sessions(user_id) -> int:
+    """Revocar todas las familias de un usuario (p. ej. al cambiar active o admin)"""
+    coll = get_async_collection("refresh_tokens")
+    result = await coll.update_many(
+        {"user_id": ObjectId(user_id), "revoked": False},
+        {"$set": {"revoked": True, "revoked_at": datetime.utcnow()}}
+    )
+    return result.modified_count
+
+
+async def revoke_refresh_token(token: str) -> bool:
+    """Cerrar la sesión: revoca el token y todos los de su familia"""
+    coll = get_async_collection("refresh_tokens")
+    doc = await coll.find_one({"token_hash": _hash_token(token)}, {"family": 1})
+    if not doc:
+        return False
+    await revoke_family(doc["family"])
+    return True
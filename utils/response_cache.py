@@ -0,0 +1,68 @@
+"""
+Caché de respuestas HTTP para lecturas públicas (catálogos, bundles, order statuses)
+
+Guarda el cuerpo JSON ya serializado de cada respuesta junto con su ETag en la
+caché compartida (utils.cache), con expiración por TTL. Los controllers que
+escriben en esas colecciones invalidan el namespace afectado en todos los workers.
+Si el cliente envía If-None-Match con el ETag vigente se responde 304 sin cuerpo.
+Los cache miss concurrentes de una misma llave se resuelven con una sola consulta
+(utils.single_flight).
+"""
+import os
+import hashlib
+from fastapi import Request, Response
+from pydantic import BaseModel
+
+from utils.cache import get_cache
+from utils.single_flight import get_flight
+from utils.responses import dumps, shape
+
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "60"))
+
+# Los clientes pueden guardar la respuesta pero deben revalidarla con el ETag en cada uso
+CACHE_CONTROL = "no-cache"
+
+
+def _serialize(result, model) -> bytes:
+    # Resultados de pipelines ya tipados: se filtran con el modelo sin re-validarlos
+    if model is not None and not isinstance(result, BaseModel):
+        result = shape(result, model)
+    return dumps(result)
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+async def cached_json_response(request: Request, namespace: str, key: str, loader, model=None) -> Response:
+    """
+    Responder desde la caché o ejecutar loader() y guardar el resultado.
+    model replica el filtrado del response_model de la ruta. Las excepciones
+    de loader (404, 500) se propagan y no se cachean.
+    """
+    cache = get_cache()
+    versioned_key = await cache.key(namespace, key)
+    cached = await cache.get(versioned_key)
+    if cached is None:
+        # Los requests concurrentes con la misma llave comparten una sola consulta a Mongo
+        async def load() -> bytes:
+            body = _serialize(await loader(), model)
+            etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+            # Una sola entrada por respuesta: "<etag>\n<cuerpo>"
+            entry = etag.encode() + b"\n" + body
+            await cache.set(versioned_key, entry, RESPONSE_CACHE_TTL_SECONDS)
+            return entry
+
+        cached = await get_flight(namespace).do(versioned_key, load)
+
+    etag, _, body = cached.partition(b"\n")
+    etag = etag.decode()
+
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
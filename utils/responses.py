@@ -0,0 +1,53 @@
+"""
+Serialización JSON rápida para resultados de MongoDB
+
+orjson codifica datetime de forma nativa y aquí también ObjectId, así los
+resultados de las pipelines se pueden enviar tal cual, sin pasar por
+jsonable_encoder ni por la re-validación del response_model. Solo debe usarse
+con datos que ya salen con la forma correcta de la base (proyecciones de las
+pipelines), no con entrada del usuario.
+"""
+import orjson
+from decimal import Decimal
+from bson import ObjectId
+from bson.decimal128 import Decimal128
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+
+def _default(obj):
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, Decimal128):
+        return float(obj.to_decimal())
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, BaseModel):
+        # Modo python: orjson codifica los valores anidados (datetime, ObjectId) con este mismo default
+        return obj.model_dump()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def shape(row: dict, model) -> dict:
+    """
+    Dejar solo los campos del modelo (con sus defaults si faltan), sin validar.
+    Equivale al filtrado del response_model para filas que ya vienen tipadas de la base.
+    """
+    shaped = {}
+    for name, field in model.model_fields.items():
+        if name in row:
+            shaped[name] = row[name]
+        elif not field.is_required():
+            shaped[name] = field.get_default(call_default_factory=True)
+    return shaped
+
+
+class ORJSONResponse(JSONResponse):
+    """JSONResponse con orjson y soporte de ObjectId/datetime; retornarla directamente evita jsonable_encoder"""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
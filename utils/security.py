@@ -1,21 +1,51 @@
 import os
+import time
 import secrets
 import hashlib
 import base64
+import threading
 import jwt
 
 from datetime import datetime, timedelta
 from fastapi import HTTPException, Depends, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from dotenv import load_dotenv
 from jwt import PyJWTError
 from functools import wraps
+from collections import OrderedDict
 
-load_dotenv()
-
-SECRET_KEY = os.getenv("SECRET_KEY")
 security = HTTPBearer()
 
+def get_secret_key() -> str:
+    # Se lee en cada uso para no depender del orden de carga del .env
+    return os.getenv("SECRET_KEY")
+
+# Caché LRU de tokens ya verificados: digest del token -> payload (hasta su exp)
+TOKEN_CACHE_MAX_SIZE = int(os.getenv("TOKEN_CACHE_MAX_SIZE", "10000"))
+_token_cache = OrderedDict()
+_token_cache_lock = threading.Lock()  # validate_token/validate_admin corren en el threadpool
+
+def verify_token(token: str) -> dict:
+    """Verificar la firma de un JWT una sola vez por token; los usos siguientes salen de la caché hasta su exp"""
+    key = hashlib.sha256(token.encode("utf-8")).digest()
+
+    with _token_cache_lock:
+        payload = _token_cache.get(key)
+        if payload is not None:
+            if payload["exp"] > time.time():
+                _token_cache.move_to_end(key)
+                return payload
+            del _token_cache[key]
+            raise jwt.ExpiredSignatureError("Signature has expired")
+
+    payload = jwt.decode(token, get_secret_key(), algorithms=["HS256"], options={"require": ["exp"]})
+
+    with _token_cache_lock:
+        _token_cache[key] = payload
+        if len(_token_cache) > TOKEN_CACHE_MAX_SIZE:
+            _token_cache.popitem(last=False)
+
+    return payload
+
 # Función para crear un JWT
 def create_jwt_token(
         firstname:str
@@ -37,7 +67,7 @@ def create_jwt_token(
             "exp": expiration,
             "iat": datetime.utcnow()
         },
-        SECRET_KEY,
+        get_secret_key(),
         algorithm="HS256"
     )
     return token
@@ -58,27 +88,24 @@ def validateuser(func):
             raise HTTPException( status_code=400, detail="Invalid auth schema"  )
 
         try:
-            payload = jwt.decode( token , SECRET_KEY, algorithms=["HS256"] )
+            payload = verify_token( token )
 
             email = payload.get("email")
             firstname = payload.get("firstname")
             lastname = payload.get("lastname")
             active = payload.get("active")
-            exp = payload.get("exp")
             id = payload.get("id")
 
             if email is None:
                 raise HTTPException( status_code=401 , detail="Token Invalid" )
 
-            if datetime.utcfromtimestamp(exp) < datetime.utcnow():
-                raise HTTPException( status_code=401 , detail="Expired token" )
-
             if not active:
                 raise HTTPException( status_code=401 , detail="Inactive user" )
 
             request.state.email = email
             request.state.firstname = firstname
             request.state.lastname = lastname
+            request.state.admin = bool(payload.get("admin", False))
             request.state.id = id
 
 
@@ -104,22 +131,18 @@ def validateadmin(func):
             raise HTTPException( status_code=400, detail="Invalid auth schema"  )
 
         try:
-            payload = jwt.decode( token , SECRET_KEY, algorithms=["HS256"] )
+            payload = verify_token( token )
 
             email = payload.get("email")
             firstname = payload.get("firstname")
             lastname = payload.get("lastname")
             active = payload.get("active")
             admin = payload.get("admin")
-            exp = payload.get("exp")
             id = payload.get("id")
 
             if email is None:
                 raise HTTPException( status_code=401 , detail="Token Invalid" )
 
-            if datetime.utcfromtimestamp(exp) < datetime.utcnow():
-                raise HTTPException( status_code=401 , detail="Expired token" )
-
             if not active or not admin:
                 raise HTTPException( status_code=401 , detail="Inactive user or not admin" )
 
@@ -143,22 +166,18 @@ def validate_token(credentials: HTTPAuthorizationCredentials = Depends(security)
     token = credentials.credentials
     
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        payload = verify_token(token)
         
         email = payload.get("email")
         firstname = payload.get("firstname")
         lastname = payload.get("lastname")
         active = payload.get("active")
         admin = payload.get("admin", False)
-        exp = payload.get("exp")
         user_id = payload.get("id")
         
         if email is None:
             raise HTTPException(status_code=401, detail="Token Invalid")
         
-        if datetime.utcfromtimestamp(exp) < datetime.utcnow():
-            raise HTTPException(status_code=401, detail="Expired token")
-        
         if not active:
             raise HTTPException(status_code=401, detail="Inactive user")
         
@@ -180,22 +199,18 @@ def validate_admin(credentials: HTTPAuthorizationCredentials = Depends(security)
     token = credentials.credentials
     
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        payload = verify_token(token)
         
         email = payload.get("email")
         firstname = payload.get("firstname")
         lastname = payload.get("lastname")
         active = payload.get("active")
         admin = payload.get("admin", False)
-        exp = payload.get("exp")
         user_id = payload.get("id")
         
         if email is None:
             raise HTTPException(status_code=401, detail="Token Invalid")
         
-        if datetime.utcfromtimestamp(exp) < datetime.utcnow():
-            raise HTTPException(status_code=401, detail="Expired token")
-        
         if not active or not admin:
             raise HTTPException(status_code=401, detail="Inactive user or not admin")
         
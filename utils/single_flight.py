@@ -0,0 +1,57 @@
+"""
+Single-flight: requests concurrentes idénticos comparten una sola ejecución
+
+Cuando muchos requests piden lo mismo a la vez (p. ej. un producto enlazado en
+redes sociales con la caché recién invalidada), solo el primero ejecuta la
+consulta a Mongo; los demás esperan ese mismo resultado. La ejecución corre en
+su propia tarea, así la desconexión del primer cliente no cancela a los demás.
+"""
+import asyncio
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight = {}
+        self.calls = 0
+        self.executions = 0
+
+    async def do(self, key: str, fn):
+        """Ejecutar fn() una sola vez por key mientras haya una ejecución en curso"""
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        return await asyncio.shield(task)
+
+    def _done(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Marcar la excepción como leída aunque todos los que esperaban se hayan cancelado
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        shared = self.calls - self.executions
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": shared,
+            "coalescing_ratio": round(shared / self.calls, 4) if self.calls else 0.0,
+            "in_flight": len(self._inflight)
+        }
+
+
+_flights = {}
+
+def get_flight(name: str) -> SingleFlight:
+    if name not in _flights:
+        _flights[name] = SingleFlight(name)
+    return _flights[name]
+
+
+def flight_stats() -> dict:
+    return {name: flight.stats() for name, flight in _flights.items()}
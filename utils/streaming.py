@@ -0,0 +1,59 @@
+"""
+Respuestas en streaming para listados grandes
+
+Recorre el cursor de MongoDB por lotes (batchSize) y escribe las filas a medida
+que llegan, en NDJSON (una fila JSON por línea) o como un arreglo JSON
+fragmentado. La memoria por request queda acotada al lote en curso y el primer
+byte sale apenas llega el primer lote.
+"""
+import os
+import logging
+from fastapi.responses import StreamingResponse
+
+from utils.responses import dumps
+
+logger = logging.getLogger(__name__)
+
+STREAM_BATCH_SIZE = int(os.getenv("MONGO_STREAM_BATCH_SIZE", "500"))
+# Agrupar filas en chunks de este tamaño para no escribir al socket fila por fila
+STREAM_CHUNK_BYTES = int(os.getenv("STREAM_CHUNK_BYTES", "65536"))
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "json": "application/json",
+}
+
+
+async def _iter_chunks(cursor, fmt: str):
+    ndjson = fmt == "ndjson"
+    buffer = bytearray() if ndjson else bytearray(b"[")
+    first = True
+    try:
+        async for row in cursor:
+            if ndjson:
+                buffer += dumps(row) + b"\n"
+            else:
+                if not first:
+                    buffer += b","
+                buffer += dumps(row)
+            first = False
+
+            if len(buffer) >= STREAM_CHUNK_BYTES:
+                yield bytes(buffer)
+                buffer.clear()
+
+        if not ndjson:
+            buffer += b"]"
+        if buffer:
+            yield bytes(buffer)
+    except Exception as e:
+        # Los headers ya se enviaron: solo queda cortar la respuesta y registrarlo
+        logger.error(f"Streaming aborted: {e}")
+        raise
+    finally:
+        await cursor.close()
+
+
+def stream_response(cursor, fmt: str = "ndjson") -> StreamingResponse:
+    """StreamingResponse a partir de un cursor ya abierto (abrirlo antes permite responder 500 si la consulta falla)"""
+    return StreamingResponse(_iter_chunks(cursor, fmt), media_type=MEDIA_TYPES[fmt])